@@ -0,0 +1,369 @@
+from graph import *
+from graph_helper import *
+from input_output import *
+from solver_algorithms import *
+from graph_generator import create_hard_tree_and_graph
+import argparse
+import json
+import math
+import os
+import random
+import reader
+import shutil
+import sys
+import tempfile
+import time
+
+"""
+This file contains benchmarks for our graph code. Run it from any directory:
+
+	$ python benchmarks.py [--quick] [--sections SECTION ...]
+	                       [--save-baseline [FILE]] [--baseline FILE | --no-baseline]
+
+The sections are:
+- search: Graph.search against the old recursive search.
+- io: reading (text and binary cache), writing and checking graph files.
+- algorithms: every algorithm in ALGORITHMS on the sample and submission instances,
+  with throughput, latency percentiles and leaf counts relative to our known trees.
+- scaling: every algorithm on generated instances of growing size, with the exponent
+  of the fitted power law time ~ size ** exponent.
+
+Every result is also a named metric. The metrics are compared with the baseline
+(BASELINE_FILE, or QUICK_BASELINE_FILE with --quick, unless --baseline names another
+file), and every metric that got worse by more than BENCHMARK_TOLERANCE is listed and
+makes the run exit with status 1. --save-baseline stores the metrics as the new
+baseline. Algorithms run under a time budget, so their times only compare between
+runs with the same budget; the committed baselines were measured on a single core,
+so save your own before comparing on another machine.
+"""
+
+PYTHON_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DIRECTORY = os.path.join(PYTHON_DIRECTORY, '..', 'sample')
+SUBMISSION_DIRECTORY = os.path.join(PYTHON_DIRECTORY, '..', 'submission')
+
+# (label, input file, output file of our known trees) of the instance sets
+INSTANCE_FILES = [
+	('sample', os.path.join(SAMPLE_DIRECTORY, 'hard.in'), os.path.join(SAMPLE_DIRECTORY, 'hard.out')),
+	('submission', os.path.join(PYTHON_DIRECTORY, ALL_GRAPHS_INPUT), os.path.join(SUBMISSION_DIRECTORY, 'hard.all.v3.out')),
+]
+
+# Baselines of full and quick runs
+BASELINE_FILE = os.path.join(PYTHON_DIRECTORY, 'benchmarks_baseline.json')
+QUICK_BASELINE_FILE = os.path.join(PYTHON_DIRECTORY, 'benchmarks_baseline_quick.json')
+
+SECTIONS = ['search', 'io', 'algorithms', 'scaling']
+
+# Seconds each algorithm may spend on an instance
+BENCHMARK_ALGORITHM_SECONDS = 2
+QUICK_ALGORITHM_SECONDS = 0.5
+
+# Node counts of the generated instances, and edges per node they may have
+SCALING_SIZES = [100, 200, 400, 800, 1600]
+QUICK_SCALING_SIZES = [100, 200, 400]
+SCALING_EDGES_PER_NODE = 20
+
+# Relative change beyond which a metric counts as a regression, and the smallest change
+# in seconds that counts at all (shorter times are mostly noise)
+BENCHMARK_TOLERANCE = 0.2
+BENCHMARK_NOISE_SECONDS = 0.002
+
+
+# Named results of a benchmark run, each with the direction that is better
+class Metrics:
+
+	def __init__(self):
+		self.values = {}
+
+	def add(self, name, value, better):
+		self.values[name] = {'value': value, 'better': better}
+
+	# Writes the metrics as a baseline file
+	def save(self, file_name):
+		with open(file_name, 'w') as output_file:
+			json.dump(self.values, output_file, indent=1, sort_keys=True)
+
+	# Returns a list of (name, baseline value, value) of every metric that got worse
+	# than in the baseline file by more than the tolerance
+	def compare(self, file_name, tolerance=BENCHMARK_TOLERANCE):
+		with open(file_name) as input_file:
+			baseline = json.load(input_file)
+
+		regressions = []
+		for name in sorted(self.values):
+			if name not in baseline:
+				continue
+			old_value = baseline[name]['value']
+			value = self.values[name]['value']
+			if old_value is None or value is None:
+				continue
+
+			if self.values[name]['better'] == 'lower':
+				worse = value > old_value * (1 + tolerance)
+				if name.endswith('seconds'):
+					worse = worse and value - old_value > BENCHMARK_NOISE_SECONDS
+			else:
+				worse = value < old_value * (1 - tolerance)
+			if worse:
+				regressions.append((name, old_value, value))
+
+		return regressions
+
+
+# Returns the best wall-clock time, in seconds, of `repeats` calls to function()
+def time_call(function, repeats=3):
+	best_time = None
+	for _ in range(repeats):
+		start_time = time.time()
+		function()
+		elapsed = time.time() - start_time
+		if best_time is None or elapsed < best_time:
+			best_time = elapsed
+	return best_time
+
+
+# Returns the given percentile (0-100) of a list of numbers, by nearest rank
+def percentile(values, percent):
+	ordered = sorted(values)
+	rank = max(1, int(math.ceil(percent / 100.0 * len(ordered))))
+	return ordered[rank - 1]
+
+
+# Returns the exponent of the power law y = c * x ** exponent that best fits the points,
+# by least squares on their logarithms, or None with fewer than two usable points
+def fit_exponent(xs, ys):
+	points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+	if len(points) < 2:
+		return None
+	mean_x = sum(x for x, _ in points) / len(points)
+	mean_y = sum(y for _, y in points) / len(points)
+	variance = sum((x - mean_x) ** 2 for x, _ in points)
+	if variance == 0:
+		return None
+	return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+# The recursive depth-first search that Graph.search used to run, kept as a baseline
+# Returns (number of components, whether there is a cycle)
+def recursive_search(graph):
+	visited = [False] * len(graph.neighbors)
+	state = {'components': 0, 'has_cycle': False}
+
+	def dfs(node, parent):
+		visited[node] = True
+		for u in graph.neighbors[node]:
+			if u != parent:
+				if not visited[u]:
+					dfs(u, node)
+				else:
+					state['has_cycle'] = True
+
+	for i in range(len(graph.neighbors)):
+		if len(graph.neighbors[i]) > 0 and not visited[i]:
+			state['components'] += 1
+			dfs(i, -1)
+
+	return state['components'], state['has_cycle']
+
+
+# Returns a line graph 0 - 1 - ... - (number_of_nodes - 1)
+def create_line_graph(number_of_nodes):
+	line = Graph(number_of_nodes)
+	for node in range(1, number_of_nodes):
+		line.add_edge_uv(node - 1, node)
+	return line
+
+
+# Compares Graph.search with the recursive baseline on the sample inputs, and on line
+# graphs longer than the recursion limit
+def benchmark_search(metrics, quick=False):
+	print('Graph.search vs. recursive search (best of 3, seconds)')
+
+	for label, file_name in [('sample/hard.in', os.path.join(SAMPLE_DIRECTORY, 'hard.in')), (OUR_GRAPHS, os.path.join(PYTHON_DIRECTORY, OUR_GRAPHS)), (ALL_GRAPHS_INPUT, os.path.join(PYTHON_DIRECTORY, ALL_GRAPHS_INPUT))]:
+		graphs = input_graphs_from_file(file_name)
+		recursive_time = time_call(lambda: [recursive_search(graph) for graph in graphs])
+		search_time = time_call(lambda: [graph.search() for graph in graphs])
+		print('{0:<24}{1:>6} graphs\trecursive: {2:.4f}\tsearch: {3:.4f}\tspeedup: {4:.1f}x'.format(
+			label, len(graphs), recursive_time, search_time, recursive_time / search_time))
+		metrics.add('search/' + label + '/seconds', search_time, 'lower')
+
+	for number_of_nodes in ([10 ** 3, 10 ** 5] if quick else [10 ** 3, 10 ** 5, 10 ** 6]):
+		line = create_line_graph(number_of_nodes)
+
+		try:
+			recursive_time = '{0:.4f}'.format(time_call(lambda: recursive_search(line), 1))
+		except RecursionError:
+			recursive_time = 'RecursionError'
+		search_time = time_call(line.search, 1)
+		print('{0:<24}{1:>6} nodes\trecursive: {2}\tsearch: {3:.4f}'.format(
+			'line graph', number_of_nodes, recursive_time, search_time))
+		metrics.add('search/line graph ' + str(number_of_nodes) + '/seconds', search_time, 'lower')
+
+
+# Times reading, caching, writing and checking each instance set's files
+def benchmark_io(metrics, quick=False):
+	print('\nFile I/O and checking (best of 3)')
+	temporary_directory = tempfile.mkdtemp()
+	try:
+		for label, input_file_name, output_file_name in INSTANCE_FILES:
+			for kind, file_name in [('in', input_file_name), ('out', output_file_name)]:
+				# Work on a copy, so that caches are written to the temporary directory
+				copy_name = os.path.join(temporary_directory, label + '.' + kind)
+				shutil.copyfile(file_name, copy_name)
+				megabytes = os.path.getsize(copy_name) / 1e6
+				graphs = input_graphs_from_file(copy_name)
+				number_of_edges = sum(graph.num_edges() for graph in graphs)
+
+				save_graphs_to_cache(copy_name, graphs)
+				timings = [
+					('read text', time_call(lambda: input_graphs_from_file(copy_name))),
+					('read cache', time_call(lambda: load_graphs_from_cache(copy_name))),
+					('write', time_call(lambda: output_graphs_to_new_file(graphs, copy_name + '.written'))),
+				]
+				for step, seconds in timings:
+					print('{0:<24}{1:<12}{2:>8.4f} s\t{3:>7.1f} MB/s\t{4:>10.0f} edges/s'.format(
+						label + '.' + kind, step, seconds, megabytes / seconds, number_of_edges / seconds))
+					metrics.add('io/' + label + '.' + kind + '/' + step + '/seconds', seconds, 'lower')
+
+			# Check the input file alone, then the output file against it
+			in_reader = [None]
+
+			def check_input():
+				with open(input_file_name) as input_file:
+					in_reader[0] = reader.InFileReader(input_file)
+					return in_reader[0].read_input_file()
+
+			def check_output():
+				with open(output_file_name) as output_file:
+					reader.OutFileReader(output_file).read_output_file(edge_sets, in_reader[0].node_counts)
+
+			edge_sets = check_input()
+			for step, function in [('check input', check_input), ('check output', check_output)]:
+				seconds = time_call(function)
+				print('{0:<24}{1:<12}{2:>8.4f} s'.format(label, step, seconds))
+				metrics.add('io/' + label + '/' + step + '/seconds', seconds, 'lower')
+	finally:
+		shutil.rmtree(temporary_directory)
+
+
+# Runs every algorithm on every graph of each instance set, and reports its time,
+# latency percentiles and leaves relative to our known trees
+def benchmark_algorithms(metrics, quick=False):
+	seconds = QUICK_ALGORITHM_SECONDS if quick else BENCHMARK_ALGORITHM_SECONDS
+	print('\nAlgorithms ({0} s budget per instance)'.format(seconds))
+	print('{0:<12}{1:<24}{2:>7}{3:>10}{4:>10}{5:>10}{6:>10}{7:>10}{8:>8}{9:>9}'.format(
+		'instances', 'algorithm', 'solved', 'seconds', 'graphs/s', 'p50 ms', 'p90 ms', 'p99 ms', 'leaves', 'quality'))
+
+	for label, input_file_name, output_file_name in INSTANCE_FILES:
+		graphs = input_graphs_from_file(input_file_name)
+		known_trees = input_graphs_from_file(output_file_name)
+
+		for algorithm_name, algorithm in ALGORITHMS:
+			latencies = []
+			solved = 0
+			leaves = 0
+			known_leaves = 0
+			for graph, known_tree in zip(graphs, known_trees):
+				start_time = time.perf_counter()
+				tree = algorithm(graph, Budget(seconds))
+				latencies.append(time.perf_counter() - start_time)
+				if tree is not None:
+					solved += 1
+					leaves += len(get_leaves(tree))
+					known_leaves += len(get_leaves(known_tree))
+
+			total_seconds = sum(latencies)
+			quality = float(leaves) / known_leaves if known_leaves > 0 else None
+			name = 'algorithms/' + label + '/' + algorithm_name + '/'
+			metrics.add(name + 'seconds', total_seconds, 'lower')
+			metrics.add(name + 'graphs per second', len(graphs) / total_seconds, 'higher')
+			metrics.add(name + 'p50 seconds', percentile(latencies, 50), 'lower')
+			metrics.add(name + 'p90 seconds', percentile(latencies, 90), 'lower')
+			metrics.add(name + 'p99 seconds', percentile(latencies, 99), 'lower')
+			metrics.add(name + 'quality', quality, 'higher')
+
+			print('{0:<12}{1:<24}{2:>7}{3:>10.3f}{4:>10.1f}{5:>10.2f}{6:>10.2f}{7:>10.2f}{8:>8}{9:>9}'.format(
+				label, algorithm_name, solved, total_seconds, len(graphs) / total_seconds,
+				1000 * percentile(latencies, 50), 1000 * percentile(latencies, 90), 1000 * percentile(latencies, 99),
+				leaves, '-' if quality is None else '{0:.3f}'.format(quality)))
+
+
+# Runs every algorithm on generated instances of growing size, and reports how its
+# time grows with size and how its trees compare with the generated leafy trees
+def benchmark_scaling(metrics, quick=False):
+	seconds = QUICK_ALGORITHM_SECONDS if quick else BENCHMARK_ALGORITHM_SECONDS
+	sizes = QUICK_SCALING_SIZES if quick else SCALING_SIZES
+	print('\nScaling on generated instances ({0} s budget per instance)'.format(seconds))
+
+	for construction_name, construction_type in [('constant', CONSTANT), ('random', RANDOM)]:
+		instances = []
+		for size in sizes:
+			random.seed(size)
+			instances.append(create_hard_tree_and_graph(construction_type, size, SCALING_EDGES_PER_NODE * size))
+
+		print('{0:<10}{1:<24}'.format(construction_name, 'algorithm') + ''.join('{0:>16}'.format(str(size) + ' nodes') for size in sizes) + '{0:>10}'.format('exponent'))
+		for algorithm_name, algorithm in ALGORITHMS:
+			times = []
+			cells = []
+			for size, (leafy_tree, graph) in zip(sizes, instances):
+				start_time = time.perf_counter()
+				tree = algorithm(graph, Budget(seconds))
+				elapsed = time.perf_counter() - start_time
+				if tree is None:
+					times.append(0)
+					cells.append('-')
+					continue
+
+				times.append(elapsed)
+				quality = float(len(get_leaves(tree))) / len(get_leaves(leafy_tree))
+				cells.append('{0:.3f}s {1:.2f}'.format(elapsed, quality))
+				name = 'scaling/' + construction_name + '/' + algorithm_name + '/' + str(size) + '/'
+				metrics.add(name + 'seconds', elapsed, 'lower')
+				metrics.add(name + 'quality', quality, 'higher')
+
+			exponent = fit_exponent(sizes, times)
+			print('{0:<10}{1:<24}'.format(construction_name, algorithm_name) + ''.join('{0:>16}'.format(cell) for cell in cells) +
+				'{0:>10}'.format('-' if exponent is None else '{0:.2f}'.format(exponent)))
+
+
+BENCHMARKS = {
+	'search': benchmark_search,
+	'io': benchmark_io,
+	'algorithms': benchmark_algorithms,
+	'scaling': benchmark_scaling,
+}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks for our graph code.')
+	parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS)
+	parser.add_argument('--quick', action='store_true', help='smaller instances and budgets')
+	parser.add_argument('--baseline', metavar='FILE', help='compare with the metrics in FILE instead of the default baseline')
+	parser.add_argument('--no-baseline', action='store_true', help='do not compare with a baseline')
+	parser.add_argument('--save-baseline', metavar='FILE', nargs='?', const='', help='save the metrics to FILE (by default, the default baseline)')
+	arguments = parser.parse_args()
+
+	default_baseline = QUICK_BASELINE_FILE if arguments.quick else BASELINE_FILE
+	baseline = arguments.baseline or default_baseline
+
+	metrics = Metrics()
+	for section in arguments.sections:
+		BENCHMARKS[section](metrics, arguments.quick)
+
+	if arguments.save_baseline is not None:
+		save_baseline = arguments.save_baseline or default_baseline
+		metrics.save(save_baseline)
+		print('\nSaved ' + str(len(metrics.values)) + ' metrics to ' + save_baseline)
+	elif not arguments.no_baseline:
+		if not os.path.exists(baseline):
+			print('\nNo baseline at ' + baseline + '; save one with --save-baseline')
+			return
+		regressions = metrics.compare(baseline)
+		print('\nRegressions against ' + baseline + ': ' + str(len(regressions)))
+		for name, old_value, value in regressions:
+			print('{0:<72}{1:>12.4f} -> {2:.4f}'.format(name, old_value, value))
+		if regressions:
+			sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -1,7 +1,19 @@
 import config
 import reader
 
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+import argparse
+import io
+import re
 import sys
+import time
+
+# Matches a line holding one natural number, like NUMBER_FORMAT_REGEXP[1]
+COUNT_REGEXP = re.compile(reader.NUMBER_FORMAT_REGEXP[1].pattern.encode())
+
+# Number of chunks each job checks, to even out graphs of different sizes
+CHUNKS_PER_JOB = 4
 
 def print_error(err):
     sys.stderr.write(err)
@@ -9,33 +21,50 @@ def print_error(err):
 def print_message(msg):
     sys.stdout.write(msg)
 
-def check_input():
-    infile = config.DEFAULT_INPUT_FILE if len(sys.argv) <= 1 else sys.argv[1]
+def parse_options(program_name):
+    parser = argparse.ArgumentParser(prog=program_name)
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+            help='check graphs in N processes')
+    parser.add_argument('--summary', action='store_true',
+            help='print leaf count totals and timings instead of one line '+
+            'per output tree')
+    parser.add_argument('--max-nodes', type=int, metavar='N',
+            help='allow node IDs up to N-1 (default {0})'.format(
+                config.MAX_NUM_NODES))
+    parser.add_argument('--max-edges', type=int, metavar='N',
+            help='allow up to N edges per graph (default {0})'.format(
+                config.MAX_NUM_EDGES))
+    options = parser.parse_args(sys.argv[1:])
 
-    edge_sets = None
-    try:
-        f = open(infile)
-        in_reader = reader.InFileReader(f)
-        edge_sets = in_reader.read_input_file()
-        print_message("Input file '{0}' has the correct format.\n".format(infile))
+    if options.max_nodes is not None:
+        config.MAX_NUM_NODES = options.max_nodes
+    if options.max_edges is not None:
+        config.MAX_NUM_EDGES = options.max_edges
+    return options
 
-    except IOError as e:
-        print_error("Error reading '{0}' ({1}).\n".format(infile, e))
-    except reader.ReaderException as e:
-        print_error("({0}) {1}\n".format(infile, e))
+def check_input(check_input_program_name='check_input.py'):
+    """
+    Checks the input file. Returns its edge sets, as sets of packed edge
+    keys (see graph.edge_key), or None if it is invalid.
+    """
+    options = parse_options(check_input_program_name)
+    infile = config.DEFAULT_INPUT_FILE if len(options.files) == 0 else options.files[0]
 
-    return edge_sets
+    return check_files(infile, None, options, keep_edge_sets=True)[0]
 
 def check_output(check_output_program_name):
-    num_args = len(sys.argv)-1
+    options = parse_options(check_output_program_name)
+    num_args = len(options.files)
 
     if num_args == 0:
+        infile = config.DEFAULT_INPUT_FILE
         outfile = config.DEFAULT_OUTPUT_FILE
     elif num_args == 2:
-        outfile = sys.argv[2]
+        infile, outfile = options.files
     else:
         print_error((
-            "usage: {0} [file.in file.out]\n\n"+
+            "usage: {0} [--jobs N] [--summary] [file.in file.out]\n\n"+
             "  Check the format of \"file.out\" against \"file.in\".\n"+
             "Error: Must provide either two arguments, or zero "+
             "arguments to use the default\n"+
@@ -45,22 +74,229 @@ def check_output(check_output_program_name):
                 num_args))
         return None
 
-    edge_sets = check_input()
+    return check_files(infile, outfile, options)[2]
+
+def check_files(infile, outfile, options, keep_edge_sets=False):
+    """
+    Checks the input file, and the output file against it unless outfile is
+    None, printing the results. Returns (edge sets, node counts, numbers of
+    leaves); each is None if its file is invalid or was not checked. Unless
+    keep_edge_sets is set, files checked with --jobs leave their edge sets
+    in the worker processes, and the edge sets are None.
+    """
+    start_time = time.time()
+    if options.jobs > 1:
+        edge_sets, node_counts, num_leaves, error, timings = check_in_parallel(
+                infile, outfile, options.jobs, keep_edge_sets)
+    else:
+        edge_sets, node_counts, num_leaves, error, timings = check_serially(
+                infile, outfile)
+    timings['total'] = time.time() - start_time
+
+    if node_counts is None:
+        print_error(error)
+        return None, None, None
+    print_message("Input file '{0}' has the correct format.\n".format(infile))
+
+    if outfile is not None and node_counts:
+        if num_leaves is None:
+            print_error(error)
+            return edge_sets, node_counts, None
+        print_message("Output file '{0}' has the correct format.\n".format(outfile))
+        if not options.summary:
+            for i in range(len(num_leaves)):
+                print_message("Output tree {0} has {1} leaves.\n".format(i+1, num_leaves[i]))
+
+    if options.summary:
+        print_summary(node_counts, num_leaves, timings, options.jobs)
+
+    return edge_sets, node_counts, num_leaves
+
+def print_summary(node_counts, num_leaves, timings, jobs):
+    print_message('Graphs: {0}, with {1} non-isolated nodes in total.\n'.format(
+        len(node_counts), sum(node_counts)))
+    if num_leaves:
+        print_message(('Leaves: {0} in total, {1} to {2} per tree '+
+            '(mean {3:.1f}).\n').format(sum(num_leaves), min(num_leaves),
+                max(num_leaves), float(sum(num_leaves)) / len(num_leaves)))
+        print_message('Leaves per tree: {0}\n'.format(
+            ' '.join(str(leaves) for leaves in num_leaves)))
+    steps = ', '.join('{0} {1:.3f}s'.format(step, seconds)
+            for step, seconds in timings.items() if step != 'total')
+    print_message('Time: {0:.3f}s ({1}) with {2} job{3}.\n'.format(
+        timings['total'], steps, jobs, '' if jobs == 1 else 's'))
+
+def check_serially(infile, outfile):
+    """
+    Checks the files with the reader in this process. Returns (edge sets,
+    node counts, numbers of leaves, message of the first error, timings).
+    """
+    edge_sets = None
+    node_counts = None
     num_leaves = None
-    if not edge_sets:
-        return None
+    error = None
+    timings = {}
 
+    start_time = time.time()
     try:
-        f = open(outfile)
-        out_reader = reader.OutFileReader(f)
-        num_leaves = out_reader.read_output_file(edge_sets)
-        print_message("Output file '{0}' has the correct format.\n".format(outfile))
-        for i in range(len(edge_sets)):
-            print_message("Output tree {0} has {1} leaves.\n".format(i+1, num_leaves[i]))
+        with open(infile) as f:
+            in_reader = reader.InFileReader(f)
+            edge_sets = in_reader.read_input_file()
+            node_counts = in_reader.node_counts
+    except IOError as e:
+        error = "Error reading '{0}' ({1}).\n".format(infile, e)
+    except reader.ReaderException as e:
+        error = "({0}) {1}\n".format(infile, e)
+    timings['input'] = time.time() - start_time
 
+    if outfile is None or not edge_sets:
+        return edge_sets, node_counts, num_leaves, error, timings
+
+    start_time = time.time()
+    try:
+        with open(outfile) as f:
+            out_reader = reader.OutFileReader(f)
+            num_leaves = out_reader.read_output_file(edge_sets, node_counts)
     except IOError as e:
-        print_error("Error reading '{0}' ({1}).\n".format(outfile, e))
+        error = "Error reading '{0}' ({1}).\n".format(outfile, e)
     except reader.ReaderException as e:
-        print_error("({0}) {1}\n".format(outfile, e))
+        error = "({0}) {1}\n".format(outfile, e)
+    timings['output'] = time.time() - start_time
+
+    return edge_sets, node_counts, num_leaves, error, timings
+
+def check_in_parallel(infile, outfile, jobs, keep_edge_sets=False):
+    """
+    Checks the files in `jobs` processes, each reading a run of graphs from
+    the byte ranges found by index_cases. Returns what check_serially does;
+    errors are the ones the serial reader would report first, with the same
+    line numbers. The edge sets are only sent back from the workers if
+    keep_edge_sets is set, and are None otherwise.
+    """
+    start_time = time.time()
+    in_cases = index_cases(infile)
+    out_cases = None if outfile is None else index_cases(outfile)
+    index_time = time.time() - start_time
+
+    # The serial reader finds and reports whatever keeps a file from indexing
+    if not in_cases or (outfile is not None and
+            (out_cases is None or len(out_cases) != len(in_cases))):
+        edge_sets, node_counts, num_leaves, error, timings = check_serially(
+                infile, outfile)
+        timings['index'] = index_time
+        return (edge_sets if keep_edge_sets else None), node_counts, num_leaves, error, timings
+
+    num_cases = len(in_cases)
+    chunk_size = max(1, -(-num_cases // (jobs * CHUNKS_PER_JOB)))
+    chunks = []
+    for first in range(0, num_cases, chunk_size):
+        last = min(first + chunk_size, num_cases) - 1
+        in_range = (in_cases[first][0], in_cases[last][1], in_cases[first][2])
+        out_range = None
+        if out_cases is not None:
+            out_range = (out_cases[first][0], out_cases[last][1], out_cases[first][2])
+        chunks.append((infile, in_range, outfile, out_range, first, last - first + 1,
+            (config.MAX_NUM_NODES, config.MAX_NUM_EDGES), keep_edge_sets))
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(check_chunk, *zip(*chunks)))
+    timings = {'index': index_time, 'check': time.time() - start_time}
+
+    node_counts = [n for result in results for n in result[0]]
+    num_leaves = None if outfile is None else [n for result in results for n in result[1]]
+    edge_sets = [es for result in results for es in result[3]] if keep_edge_sets else None
+
+    # Every input error comes before every output error, as in check_serially
+    errors = [result[2] for result in results if result[2] is not None]
+    if errors:
+        file_index, file_name, line_num, case_num, line, message = min(errors)
+        exception = reader.ReaderException(line_num, case_num, line, message)
+        error = "({0}) {1}\n".format(file_name, exception)
+        if file_index == 0:
+            return None, None, None, error, timings
+        return edge_sets, node_counts, None, error, timings
+
+    return edge_sets, node_counts, num_leaves, None, timings
+
+def index_cases(file_name):
+    """
+    Returns (start byte, end byte, first line number) of each graph in the
+    file, from one pass over its line breaks and edge counts, or None if the
+    file cannot be split up that way.
+    """
+    try:
+        with open(file_name, 'rb') as f:
+            data = f.read()
+    except IOError:
+        return None
+
+    # Text mode reads lone carriage returns as line breaks too
+    if data.count(b'\r') != data.count(b'\r\n'):
+        return None
+
+    lines = data.split(b'\n')
+    line_starts = [0]
+    line_starts.extend(accumulate(len(line) + 1 for line in lines))
+
+    matches = COUNT_REGEXP.match(lines[0])
+    if not matches:
+        return None
+
+    cases = []
+    k = 1
+    for i in range(int(matches.group(1))):
+        matches = COUNT_REGEXP.match(lines[k]) if k < len(lines) else None
+        if not matches:
+            return None
+        end = k + 1 + int(matches.group(1))
+        if end > len(lines):
+            return None
+        cases.append((line_starts[k], line_starts[end], k + 1))
+        k = end
+
+    # Nothing may follow the last graph but the final line break
+    if lines[k:] not in ([], [b'']):
+        return None
+
+    return cases
+
+def check_chunk(infile, in_range, outfile, out_range, first_case, num_cases,
+        limits, keep_edge_sets=False):
+    """
+    Checks num_cases graphs after Graph #first_case in a worker process,
+    under the given (MAX_NUM_NODES, MAX_NUM_EDGES).
+    Returns (node counts, numbers of leaves, error, edge sets); error is None
+    or the (0 for the input file or 1 for the output file, file name, line
+    number, graph number, line, message) of the first ReaderException, and
+    the edge sets are empty unless keep_edge_sets is set.
+    """
+    config.MAX_NUM_NODES, config.MAX_NUM_EDGES = limits
+
+    in_reader = reader.InFileReader(read_range(infile, in_range))
+    in_reader.line_num = in_range[2] - 1
+    in_reader.node_counts = []
+    try:
+        edge_sets = in_reader.read_input_graphs(first_case, num_cases)
+    except reader.ReaderException as e:
+        return [], [], (0, infile, e.line_num, e.case_num, e.line, e.message), []
+
+    kept_edge_sets = edge_sets if keep_edge_sets else []
+    if outfile is None:
+        return in_reader.node_counts, [], None, kept_edge_sets
+
+    out_reader = reader.OutFileReader(read_range(outfile, out_range))
+    out_reader.line_num = out_range[2] - 1
+    try:
+        num_leaves = out_reader.read_output_graphs(first_case, edge_sets,
+                in_reader.node_counts)
+    except reader.ReaderException as e:
+        return in_reader.node_counts, [], (1, outfile, e.line_num, e.case_num, e.line, e.message), kept_edge_sets
+
+    return in_reader.node_counts, num_leaves, None, kept_edge_sets
 
-    return num_leaves
+def read_range(file_name, byte_range):
+    with open(file_name, 'rb') as f:
+        f.seek(byte_range[0])
+        data = f.read(byte_range[1] - byte_range[0])
+    return io.StringIO(data.decode(), newline=None)
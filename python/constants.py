@@ -18,6 +18,10 @@ LEAF_FACTOR = 5
 MAXIMUM_NUMBER_OF_NODES = 100
 MAXIMUM_NUMBER_OF_EDGES = 2000
 
+# Redraws of already-joined leaf pairs in a row after which graph_containing_tree
+# lists the remaining pairs instead
+MAXIMUM_REDRAWS = 100
+
 # File names
 OUR_GRAPHS = 'hard.in'
 OUR_TREES = 'hard.out'
@@ -26,9 +30,53 @@ ALL_TREES_OUTPUT = 'hard.all.v3.out'
 TEMPORARY_TREES_OUTPUT = 'hard.all.v3.out_temporary'
 MANUALLY_SOLVED_GRAPHS = 'manually_solved.in'
 MANUALLY_SOLVED_TREES = 'manually_solved.out'
+SOLUTION_STORE = 'solutions.db'
+INSTRUMENTATION_RECORDS = 'instrumentation.jsonl'
+
+# Suffix of the binary cache written next to each graph text file that is read
+GRAPH_CACHE_SUFFIX = '.cache'
+
+# Size in bytes of the write buffer of output files
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Spanning tree algorithm parameters: randomized runs are done in batches of at most
+# RANDOM_RUN_BATCH_SIZE runs and RANDOM_RUN_BATCH_ENTRIES (runs * edges) matrix entries,
+# which bounds the memory of a batch at about 32 bytes per entry. Below
+# RANDOM_RUN_MINIMUM_BATCH_SIZE runs a batch is slower than running them one by one.
+# Runs check their budget every RANDOM_RUN_BUDGET_CHECK edges.
+NUMBER_OF_RANDOM_RUNS = 1000
+RANDOM_RUN_BATCH_SIZE = 250
+RANDOM_RUN_BATCH_ENTRIES = 1 << 21
+RANDOM_RUN_MINIMUM_BATCH_SIZE = 32
+RANDOM_RUN_BUDGET_CHECK = 1024
+
+# Exact solver parameters: largest graph it runs on (in nodes) and the largest
+# number of node sets kept in its transposition table
+EXACT_SOLVER_MAXIMUM_NODES = 50
+EXACT_SOLVER_TABLE_SIZE = 1000000
+
+# Portfolio parameters: each algorithm gets its own wall-clock (seconds) and
+# iteration budget (None means unlimited), the whole instance gets a deadline, and
+# with more than one worker the algorithms run concurrently in separate processes
+# (None means one worker per algorithm; instances solved in parallel run their
+# portfolios in one process each)
+ALGORITHM_TIME_BUDGET = 10
+ALGORITHM_ITERATION_BUDGET = None
+INSTANCE_TIME_BUDGET = 30
+PORTFOLIO_WORKERS = None
+
+# Fraction of the instance time budget by which the algorithms' deadline comes before
+# the instance deadline, leaving them time to join their forests into trees and send
+# them back
+PORTFOLIO_DEADLINE_MARGIN = 0.1
+
+# Wall-clock budget (seconds) for improving each algorithm's tree by local search, which
+# also ends at the instance deadline
+LOCAL_SEARCH_TIME_BUDGET = 5
 
-# Spanning tree algorithm parameters
-NUMBER_OF_RANDOM_RUNS = 100
+# Parallel batch solver parameters (a worker count of None uses every core)
+NUMBER_OF_WORKERS = None
+WORKER_CHUNK_SIZE = 4
 
 # Parameter to decide which graphs are small enough to be manually solved
 SMALL_NUMBER_OF_EDGES = 25
\ No newline at end of file
@@ -1,147 +1,103 @@
-'''
-unionfind.py
-
-A class that implements the Union Find data structure and algorithm.  This
-data structure allows one to find out which set an object belongs to, as well
-as join two sets.
-
-The algorithm's performance, given m union/find operations of any ordering, on
-n elements has been shown to take log* time per operation, where log* is
-pronounced log-star, and is the INVERSE of what is known as the Ackerman
-function, which is given below:
-A(0) = 1
-A(n) = 2**A(n-1)
-
-I include the functions to be complete.  Note that we can be 'inefficient'
-when performing the inverse ackerman function, as it will only take a maximum
-of 6 iterations to perform; A(5) is 65536 binary digits long (a 1 with 65535
-zeroes following).  A(6) is 2**65536 binary digits long, and cannot be
-represented by the memory of the entire universe.
-
-
-The Union Find data structure is not a universal set implementation, but can
-tell you if two objects are in the same set, in different sets, or you can
-combine two sets.
-ufset.find(obja) == ufset.find(objb)
-ufset.find(obja) != ufset.find(objb)
-ufset.union(obja, objb)
-
-
-This algorithm and data structure are primarily used for Kruskal's Minimum
-Spanning Tree algorithm for graphs, but other uses have been found.
-
-August 12, 2003 Josiah Carlson
-'''
-
-def Ackerman(inp, memo={0:1}):
-	inp = max(int(inp), 0)
-	if inp in memo:
-		return memo[inp]
-	elif inp <= 5:
-		memo[inp] = 2**ackerman(inp-1)
-		return memo[inp]
-	else:
-		print "Such a number is not representable by all the subatomic\nparticles in the universe."
-		ackerman(4);
-		out = (inp-4)*"2**" + str(memo[4])
-		print out
-		raise Exception, "NumberCannotBeRepresentedByAllSubatomicParticlesInUniverse"
-
-def inverseAckerman(inp):
-    t = 0
-    while Ackerman(t) < inp:
-        t += 1
-    return t
-
-
-class UnionFind:
-    """
-    Create an empty union find data structure.
-    """
-    def __init__(self):
-        self.num_weights = {}
-        self.parent_pointers = {}
-        self.num_to_objects = {}
-        self.objects_to_num = {}
-        self.__repr__ = self.__str__
-
-    """
-    Insert a sequence of objects into the structure.  All must be Python hashable.
-    """
-    def insert_objects(self, objects):
-        for object in objects:
-            self.find(object)
-
-    """
-    Find the root of the set that an object is in.
-    If the object was not known, will make it known, and it becomes its own set.
-    Object must be Python hashable.
-    """
-    def find(self, object):
-        if not object in self.objects_to_num:
-            obj_num = len(self.objects_to_num)
-            self.num_weights[obj_num] = 1
-            self.objects_to_num[object] = obj_num
-            self.num_to_objects[obj_num] = object
-            self.parent_pointers[obj_num] = obj_num
-            return object
-        stk = [self.objects_to_num[object]]
-        par = self.parent_pointers[stk[-1]]
-        while par != stk[-1]:
-            stk.append(par)
-            par = self.parent_pointers[par]
-        for i in stk:
-            self.parent_pointers[i] = par
-        return self.num_to_objects[par]
-
-
-    """
-    Combine the sets that contain the two objects given.
-    Both objects must be Python hashable.
-    If either or both objects are unknown, will make them known, and combine them.
-    """
-    def union(self, object1, object2):
-        o1p = self.find(object1)
-        o2p = self.find(object2)
-        if o1p != o2p:
-            on1 = self.objects_to_num[o1p]
-            on2 = self.objects_to_num[o2p]
-            w1 = self.num_weights[on1]
-            w2 = self.num_weights[on2]
-            if w1 < w2:
-                o1p, o2p, on1, on2, w1, w2 = o2p, o1p, on2, on1, w2, w1
-            self.num_weights[on1] = w1+w2
-            del self.num_weights[on2]
-            self.parent_pointers[on2] = on1
-    
-    """
-    Included for testing purposes only.
-    All information needed from the union find data structure can be attained
-    using find.
-    """
-    def __str__(self):
-        sets = {}
-        for i in xrange(len(self.objects_to_num)):
-            sets[i] = []
-        for i in self.objects_to_num:
-            sets[self.objects_to_num[self.find(i)]].append(i)
-        out = []
-        for i in sets.itervalues():
-            if i:
-                out.append(repr(i))
-        return ', '.join(out)
-
-
-if __name__ == '__main__':
-    print "Testing..."
-    uf = UnionFind()
-    az = "abcdefghijklmnopqrstuvwxyz"
-    az += az.upper()
-    uf.insert_objects(az)
-    import random
-    cnt = 0
-    while len(uf.num_weights) > 20:
-        cnt += 1
-        uf.union(random.choice(az), random.choice(az))
-    print uf, cnt
-    print "Testing complete."
+from array import array
+
+"""
+This file contains a disjoint sets (union-find) data structure over the dense
+integer elements 0..size-1, such as node IDs.
+
+Parents and ranks live in flat integer arrays. find() uses path halving and union()
+uses union by rank, so m operations on n elements take O(m * inverse_ackermann(n))
+time. reset() reuses the arrays between runs, and snapshot()/rollback() undo every
+change made since a snapshot was taken. Changes are only logged while a snapshot is
+open, so they cost nothing extra otherwise.
+"""
+
+class DisjointSets:
+
+	def __init__(self, size):
+		self.parent = array('i', range(size))
+		self.rank = array('i', [0]) * size
+		self.num_components = size
+		self.history = None
+		self.snapshots = []
+
+	def __len__(self):
+		return len(self.parent)
+
+	# Makes every element a singleton again, growing the structure to `size`
+	# elements if given, without reallocating the existing arrays
+	# Every open snapshot is closed.
+	def reset(self, size=None):
+		if size is not None and size > len(self.parent):
+			self.parent.extend(range(len(self.parent), size))
+			self.rank.extend(array('i', [0]) * (size - len(self.rank)))
+		self.parent[:] = array('i', range(len(self.parent)))
+		self.rank[:] = array('i', [0]) * len(self.rank)
+		self.num_components = len(self.parent)
+		self.history = None
+		self.snapshots = []
+
+	# Returns the representative of the set containing x
+	def find(self, x):
+		parent = self.parent
+		history = self.history
+		if history is None:
+			while parent[x] != x:
+				grandparent = parent[parent[x]]
+				parent[x] = grandparent
+				x = grandparent
+			return x
+
+		while parent[x] != x:
+			grandparent = parent[parent[x]]
+			history.append((x, parent[x], -1))
+			parent[x] = grandparent
+			x = grandparent
+		return x
+
+	# Merges the sets containing x and y. Returns whether they were different sets.
+	def union(self, x, y):
+		x = self.find(x)
+		y = self.find(y)
+		if x == y:
+			return False
+
+		rank = self.rank
+		if rank[x] < rank[y]:
+			x, y = y, x
+		if self.history is not None:
+			self.history.append((y, y, rank[x]))
+		self.parent[y] = x
+		if rank[x] == rank[y]:
+			rank[x] += 1
+		self.num_components -= 1
+		return True
+
+	# Returns whether x and y are in the same set
+	def connected(self, x, y):
+		return self.find(x) == self.find(y)
+
+	# Opens a snapshot, and returns a token that rollback() accepts to undo every
+	# later change
+	def snapshot(self):
+		if self.history is None:
+			self.history = []
+		self.snapshots.append(len(self.history))
+		return len(self.snapshots) - 1
+
+	# Undoes every change made since the given snapshot was taken, and closes it and
+	# every snapshot taken after it
+	def rollback(self, token):
+		history = self.history
+		position = self.snapshots[token]
+		while len(history) > position:
+			x, old_parent, old_rank = history.pop()
+			if old_rank >= 0:
+				# Undo a union: x was a root, and its new root's rank was old_rank
+				root = self.parent[x]
+				self.rank[root] = old_rank
+				self.num_components += 1
+			self.parent[x] = old_parent
+
+		del self.snapshots[token:]
+		if not self.snapshots:
+			self.history = None
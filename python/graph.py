@@ -1,5 +1,11 @@
 import config
 
+import hashlib
+import sys
+from array import array
+from collections.abc import Sequence, Set
+from itertools import compress
+
 class EdgeException(Exception):
     def __init__(self, value):
         self.value = value
@@ -7,82 +13,411 @@ class EdgeException(Exception):
     def __str__(self):
         return repr(self.value)
 
-class Edge:
+# Edges are stored inside a Graph as packed integer keys; an Edge object is
+# only a view on such a key, created when a caller asks for one. A key holds
+# the smaller end in its high 32 bits and the larger end in its low 32 bits,
+# so keys do not depend on config.MAX_NUM_NODES and fit in a signed 64-bit
+# integer for every node up to MAX_NODE_ID.
+EDGE_KEY_SHIFT = 32
+EDGE_KEY_MASK = (1 << EDGE_KEY_SHIFT) - 1
+
+# Largest node ID a Graph can hold (to_bytes writes nodes as int32)
+MAX_NODE_ID = 2 ** 31 - 1
+
+def edge_key(u, v):
+    if u > v:
+        u, v = v, u
+    return u << EDGE_KEY_SHIFT | v
+
+def edge_ends(key):
+    return key >> EDGE_KEY_SHIFT, key & EDGE_KEY_MASK
+
+class Edge(object):
+    __slots__ = ('ends',)
+
     def __init__(self, u, v):
-        self.ends = [min(u, v), max(u, v)]
+        self.ends = (min(u, v), max(u, v))
+
+    @classmethod
+    def from_key(cls, key):
+        e = cls.__new__(cls)
+        e.ends = edge_ends(key)
+        return e
+
+    def key(self):
+        return self.ends[0] << EDGE_KEY_SHIFT | self.ends[1]
 
     def __str__(self):
         return '({0},{1})'.format(self.ends[0], self.ends[1])
 
-    def __hash__(self):
-        return self.ends[0] * config.MAX_NUM_NODES + self.ends[1]
+    def __repr__(self):
+        return 'Edge{0}'.format(self)
 
-    def __cmp__(self):
-        return object.__cmp__(self)
+    def __hash__(self):
+        return self.ends[0] << EDGE_KEY_SHIFT | self.ends[1]
 
     def __eq__(self, rhs):
         return self.ends[0] == rhs.ends[0] and self.ends[1] == rhs.ends[1]
 
+    def __ne__(self, rhs):
+        return not self == rhs
+
     def check(self):
         for i in range(2):
             if self.ends[i] < 0 or self.ends[i] >= config.MAX_NUM_NODES:
                 raise EdgeException(('Node {0} out of range [0--{1}] '+
-                    'in edge {2}.').format(self.ends[i], MAX_NUM_NODES-1,
-                        self))
+                    'in edge {2}.').format(self.ends[i],
+                        config.MAX_NUM_NODES-1, self))
         if self.ends[0] == self.ends[1]:
             raise EdgeException('Self-loop not allowed in '+
                     'edge {0}.'.format(self))
 
 def make_graph(edge_set):
-    G = Graph(config.MAX_NUM_NODES)
+    G = Graph()
 
     for e in edge_set:
         G.add_edge(e)
 
     return G
 
-class Graph:
-    def __init__(self, numNodes):
-        self.neighbors = [ [] for i in range(numNodes) ]
+def make_graph_from_keys(keys):
+    G = Graph()
+
+    for key in keys:
+        G.add_edge_key(key)
+
+    return G
+
+def _pack_ends(keys, labels=None):
+    ends = array('i')
+    for key in keys:
+        ends.extend(edge_ends(key))
+    if labels is not None:
+        ends = array('i', [labels[node] for node in ends])
+    if sys.byteorder != 'little':
+        ends.byteswap()
+    return ends.tobytes()
+
+# Returns the graph written by Graph.to_bytes
+def make_graph_from_bytes(blob):
+    ends = array('i')
+    ends.frombytes(blob)
+    if sys.byteorder != 'little':
+        ends.byteswap()
+
+    G = Graph()
+    G.add_edges_uv(zip(ends[0::2], ends[1::2]))
+
+    return G
+
+class _Neighbors(object):
+    """Read-only view of a Graph's adjacency: neighbors[u] is a sequence."""
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return self._graph.num_node_slots
+
+    def __getitem__(self, node):
+        offsets, targets = self._graph.adjacency()
+        if node < 0 or node >= len(offsets) - 1:
+            return targets[0:0]
+        return targets[offsets[node]:offsets[node+1]]
+
+    def __iter__(self):
+        for node in range(len(self)):
+            yield self[node]
+
+class _SetView(Set):
+    """Read-only view of a set owned by a Graph."""
+    __slots__ = ('_items',)
+
+    def __init__(self, items):
+        self._items = items
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return '{{{0}}}'.format(', '.join(str(i) for i in self._items))
+
+class _EdgeList(Sequence):
+    """Read-only view of a Graph's edges; Edge objects are made on access."""
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return len(self._graph.edge_keys)
+
+    def __getitem__(self, i):
+        return Edge.from_key(self._graph.edge_keys[i])
+
+    def __iter__(self):
+        for key in self._graph.edge_keys:
+            yield Edge.from_key(key)
+
+    def __contains__(self, e):
+        return self._graph.has_edge_key(e.key())
+
+class _Degrees(Sequence):
+    """Read-only view of a Graph's degree array, indexed by node."""
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return len(self._graph._degrees)
+
+    def __getitem__(self, node):
+        return self._graph._degrees[node]
+
+class Graph(object):
+    """
+    Undirected graph stored as a list of packed edge keys (see edge_key).
+
+    The adjacency is kept in CSR form: targets[offsets[u]:offsets[u+1]] are
+    the neighbors of u, in the order their edges were added. It is rebuilt
+    lazily the first time it is read after the edge list has changed.
+
+    The node set, degree array and leaf set are updated on every added edge,
+    and are exposed through the read-only views nodes, degrees and leaves;
+    edges is a read-only sequence of Edge views.
+
+    Per-node arrays span the node IDs 0..num_node_slots-1, where
+    num_node_slots starts at numNodes and grows to one past the largest node
+    of any added edge, so a graph never allocates for config.MAX_NUM_NODES.
+
+    A graph whose nodes were renumbered (see input_output.relabel_graph) has
+    labels[u] = the original ID of node u; otherwise labels is None. to_bytes
+    and fingerprint always describe the graph in its original IDs.
+    """
+
+    def __init__(self, numNodes=0):
+        self.num_node_slots = numNodes
+        self.edge_keys = array('q')
+        self._edge_key_set = set()
+        self._degrees = array('i', [0]) * numNodes
+        self._nodes = set()
+        self._leaves = set()
+        self._offsets = None
+        self._targets = None
+        self._fingerprint = None
+        self.neighbors = _Neighbors(self)
+        self.nodes = _SetView(self._nodes)
+        self.leaves = _SetView(self._leaves)
+        self.degrees = _Degrees(self)
+        self.edges = _EdgeList(self)
         self.num_of_components = 0
-        self.num_nodes = 0
-        self.num_leaves = 0
         self.has_cycle = False
+        self.labels = None
+
+    @property
+    def num_nodes(self):
+        """Number of non-isolated nodes, kept up to date as edges are added."""
+        return len(self._nodes)
+
+    @property
+    def num_leaves(self):
+        """Number of degree-one nodes, kept up to date as edges are added."""
+        return len(self._leaves)
 
     def add_edge(self, e):
         self.add_edge_uv(e.ends[0], e.ends[1])
 
     def add_edge_uv(self, u, v):
-        self.add_directed_edge_uv(u, v)
-        self.add_directed_edge_uv(v, u)
+        self.add_edge_key(edge_key(u, v))
+
+    def add_edge_key(self, key):
+        edge_key_set = self._key_set()
+        if key in edge_key_set:
+            return
+        edge_key_set.add(key)
+        self.edge_keys.append(key)
+        u, v = edge_ends(key)
+        if v >= self.num_node_slots:
+            self._degrees.extend([0] * (v + 1 - self.num_node_slots))
+            self.num_node_slots = v + 1
+        self._add_degree(u)
+        self._add_degree(v)
+        self._offsets = None
+        self._fingerprint = None
+
+    def add_edges_uv(self, ends):
+        """Adds an edge for every (u, v) pair; faster than add_edge_uv in a loop."""
+        shift = EDGE_KEY_SHIFT
+        edge_key_set = self._key_set()
+        edge_keys = self.edge_keys
+        degrees = self._degrees
+        touched = set()
 
-    def add_directed_edge_uv(self, u, v):
-        self.neighbors[u].append(v)
+        for u, v in ends:
+            if u > v:
+                u, v = v, u
+            key = u << shift | v
+            if key in edge_key_set:
+                continue
+            edge_key_set.add(key)
+            edge_keys.append(key)
+            if v >= len(degrees):
+                degrees.extend([0] * (v + 1 - len(degrees)))
+            degrees[u] += 1
+            degrees[v] += 1
+            touched.add(u)
+            touched.add(v)
+
+        self.num_node_slots = max(self.num_node_slots, len(degrees))
+        for node in touched:
+            self._nodes.add(node)
+            if degrees[node] == 1:
+                self._leaves.add(node)
+            else:
+                self._leaves.discard(node)
+        self._offsets = None
+        self._fingerprint = None
+
+    def load_edges(self, keys, degrees):
+        """
+        Gives a graph without edges the distinct packed edge keys in the
+        array('q') keys, whose node degrees are in the array('i') degrees, in
+        bulk; for edges already known to be valid, such as those of a graph
+        cache. The set of keys is only built once an edge is looked up.
+        """
+        if self.edge_keys:
+            raise ValueError('load_edges needs a graph without edges.')
+        self._edge_key_set = None
+        self.edge_keys = keys
+        if len(degrees) < self.num_node_slots:
+            degrees.extend([0] * (self.num_node_slots - len(degrees)))
+        self._degrees = degrees
+        self.num_node_slots = len(degrees)
+        self._nodes.update(compress(range(len(degrees)), degrees))
+        self._leaves.update(node for node in self._nodes if degrees[node] == 1)
+        self._offsets = None
+        self._fingerprint = None
+
+    def _add_degree(self, node):
+        degree = self._degrees[node] + 1
+        self._degrees[node] = degree
+        if degree == 1:
+            self._nodes.add(node)
+            self._leaves.add(node)
+        elif degree == 2:
+            self._leaves.discard(node)
+
+    def _key_set(self):
+        if self._edge_key_set is None:
+            self._edge_key_set = set(self.edge_keys)
+        return self._edge_key_set
+
+    def has_edge_key(self, key):
+        return key in self._key_set()
+
+    def has_edge_uv(self, u, v):
+        return edge_key(u, v) in self._key_set()
+
+    def num_edges(self):
+        return len(self.edge_keys)
+
+    def to_bytes(self):
+        """
+        Edge list as little-endian int32 (u, v) pairs of original node IDs,
+        in insertion order.
+        """
+        return _pack_ends(self.edge_keys, self.labels)
+
+    def fingerprint(self):
+        """
+        Content hash of the graph's edge set: a SHA-1 over the sorted edge
+        list written as little-endian int32 (u, v) pairs of original node
+        IDs, so it does not depend on the order edges were added, on how keys
+        are packed or on how nodes are relabeled.
+        """
+        if self._fingerprint is None:
+            keys = self.edge_keys
+            if self.labels is not None:
+                labels = self.labels
+                keys = [edge_key(labels[u], labels[v])
+                        for u, v in map(edge_ends, keys)]
+            packed = _pack_ends(sorted(keys))
+            self._fingerprint = hashlib.sha1(packed).hexdigest()
+        return self._fingerprint
+
+    def adjacency(self):
+        if self._offsets is None:
+            self._build_adjacency()
+        return self._offsets, self._targets
+
+    def _build_adjacency(self):
+        n = self.num_node_slots
+        offsets = array('i', [0]) * (n + 1)
+        for key in self.edge_keys:
+            u, v = edge_ends(key)
+            offsets[u+1] += 1
+            offsets[v+1] += 1
+        for i in range(n):
+            offsets[i+1] += offsets[i]
+
+        fill = array('i', offsets)
+        targets = array('i', [0]) * offsets[n]
+        for key in self.edge_keys:
+            u, v = edge_ends(key)
+            targets[fill[u]] = v
+            fill[u] += 1
+            targets[fill[v]] = u
+            fill[v] += 1
+
+        self._offsets = offsets
+        self._targets = memoryview(targets)
+
+    def degree(self, node):
+        if node < 0 or node >= self.num_node_slots:
+            return 0
+        return self._degrees[node]
 
     def edges_in_one_component(self):
         return self.num_of_components == 1
 
     def search(self):
-        visited = [ False for i in range(config.MAX_NUM_NODES) ]
-        self.num_nodes = 0
-        self.num_leaves = 0
+        """
+        Verifies the structure of the graph: sets num_of_components and
+        has_cycle. Node and leaf counts do not need this; they are always
+        current.
+
+        Components are counted by an explicit-stack traversal of the CSR
+        adjacency, in O(V + E) time and without recursion. A graph without
+        parallel edges has a cycle iff it has more than V - C edges.
+        """
+        offsets, targets = self.adjacency()
+        visited = bytearray(self.num_node_slots)
         self.num_of_components = 0
-        self.has_cycle = False
 
-        def dfs(node, parent):
-            visited[node] = True
-            for u in self.neighbors[node]:
-                if u != parent:
+        for start in self._nodes:
+            if visited[start]:
+                continue
+            self.num_of_components += 1
+            visited[start] = 1
+            stack = [start]
+            while stack:
+                node = stack.pop()
+                for u in targets[offsets[node]:offsets[node+1]]:
                     if not visited[u]:
-                        dfs(u, node)
-                    else:
-                        self.has_cycle = True
-
-        for i in range(len(self.neighbors)):
-            if len(self.neighbors[i]) > 0:
-                self.num_nodes += 1
-                if len(self.neighbors[i]) == 1:
-                    self.num_leaves += 1
-                if not visited[i]:
-                    self.num_of_components += 1
-                    dfs(i, -1)
+                        visited[u] = 1
+                        stack.append(u)
+
+        self.has_cycle = (len(self.edge_keys) >
+                len(self._nodes) - self.num_of_components)
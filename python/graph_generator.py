@@ -2,7 +2,7 @@ from graph import *
 from graph_helper import *
 from constants import *
 from input_output import *
-from random import shuffle, randint
+from random import shuffle, randint, randrange
 
 """
 This file generates pairs of (leafy tree, hard graph) for part 1 of the MLST project.
@@ -24,7 +24,9 @@ generation of this graph, then the tree we built will be the MLST for the graph
 
 # Returns a tree and its corresponding hard graph
 # construction_type specifies which node-expansion function to use when building tree
-def create_hard_tree_and_graph(construction_type):
+# The tree spans number_of_nodes nodes, and the graph has at most
+# maximum_number_of_edges edges
+def create_hard_tree_and_graph(construction_type, number_of_nodes=MAXIMUM_NUMBER_OF_NODES, maximum_number_of_edges=MAXIMUM_NUMBER_OF_EDGES):
 
 	# Define the degree function for constant tree construction
 	def get_constant_branch_and_leaf_factors():
@@ -46,10 +48,10 @@ def create_hard_tree_and_graph(construction_type):
 		degree_function = get_randomized_branch_and_leaf_factors
 
 	# Build a leafy tree
-	leafy_tree = create_leafy_tree(MAXIMUM_NUMBER_OF_NODES, degree_function)
+	leafy_tree = create_leafy_tree(number_of_nodes, degree_function)
 
 	# Build a graph out of the tree
-	hard_graph = graph_containing_tree(leafy_tree)
+	hard_graph = graph_containing_tree(leafy_tree, maximum_number_of_edges)
 
 	return leafy_tree, hard_graph
 
@@ -93,7 +95,8 @@ def create_leafy_tree(number_of_nodes, get_branch_and_leaf_factors):
 
 
 # Takes a tree and returns a general graph that contains the tree and obscures its leaves.
-def graph_containing_tree(tree):
+# The graph has at most maximum_number_of_edges edges.
+def graph_containing_tree(tree, maximum_number_of_edges=MAXIMUM_NUMBER_OF_EDGES):
 
 	# Create a working copy of the tree (so we don't modify original)
 	tree_edges = get_edges(tree)
@@ -109,18 +112,47 @@ def graph_containing_tree(tree):
 		parent = graph.neighbors[leaf][0]
 		degree_remaining[leaf] = len(graph.neighbors[parent]) - 1
 
-	# Maintain a random-sorted list of all possible edges between edges
-	unused_leaf_edges = set()
-	for leaf_1 in leaves:
-		for leaf_2 in leaves:
-			if leaf_1 != leaf_2:
-				unused_leaf_edges.add(Edge(leaf_1, leaf_2))
-	unused_leaf_edges = list(unused_leaf_edges)
-	shuffle(unused_leaf_edges)
+	# Maintain a list of the leaves that can still take edges, and the position of each
+	available_leaves = [leaf for leaf in leaves if degree_remaining[leaf] > 0]
+	position = dict((leaf, i) for i, leaf in enumerate(available_leaves))
+
+	def use_degree(leaf):
+		degree_remaining[leaf] -= 1
+		if degree_remaining[leaf] == 0:
+			last_leaf = available_leaves.pop()
+			if last_leaf != leaf:
+				available_leaves[position[leaf]] = last_leaf
+				position[last_leaf] = position[leaf]
+			del position[leaf]
 
 	# Add random edges between leaves until graph has maximum allowed number of
 	# edges, or each original leaf has reached the degree of its parent
-	remaining_number_of_edges = MAXIMUM_NUMBER_OF_EDGES - len(get_edges(graph))
+	# Each edge joins a random pair of available leaves, redrawn if they are already
+	# joined; this picks uniformly among unused pairs without listing all pairs of
+	# leaves. After MAXIMUM_REDRAWS redraws in a row, the few leaves left are paired
+	# off from a shuffled list of their unused pairs instead.
+	remaining_number_of_edges = maximum_number_of_edges - len(get_edges(graph))
+	redraws = 0
+	while remaining_number_of_edges > 0 and len(available_leaves) >= 2 and redraws < MAXIMUM_REDRAWS:
+		i = randrange(len(available_leaves))
+		j = randrange(len(available_leaves) - 1)
+		if j >= i:
+			j += 1
+		leaf_1 = available_leaves[i]
+		leaf_2 = available_leaves[j]
+		if graph.has_edge_uv(leaf_1, leaf_2):
+			redraws += 1
+			continue
+
+		graph.add_edge(Edge(leaf_1, leaf_2))
+		remaining_number_of_edges -= 1
+		use_degree(leaf_1)
+		use_degree(leaf_2)
+		redraws = 0
+
+	unused_leaf_edges = [Edge(leaf_1, leaf_2) for leaf_1 in available_leaves for leaf_2 in available_leaves
+		if leaf_1 < leaf_2 and not graph.has_edge_uv(leaf_1, leaf_2)]
+	shuffle(unused_leaf_edges)
 	while remaining_number_of_edges > 0 and len(unused_leaf_edges) > 0:
 			edge = unused_leaf_edges.pop()
 			if degree_remaining[edge.ends[0]] > 0 and degree_remaining[edge.ends[1]] > 0:
@@ -11,50 +11,54 @@ This file contains convenient helper methods for graphs.
 # Returns whether the two given graph are equivalent (contain same edges and nodes)
 def are_equivalent_graphs(graph_1, graph_2):
 
-	# Test for same node sets
-	nodes_1 = set(get_nodes(graph_1))
-	nodes_2 = set(get_nodes(graph_2))
-	if nodes_1 != nodes_2:
+	# Graphs without isolated nodes have the same node sets iff they have the
+	# same edge sets, so comparing packed edge keys suffices
+	if graph_1.num_edges() != graph_2.num_edges():
 		return False
 
-	# Test for same edge sets
-	edges_1 = set(get_edges(graph_1))
-	edges_2 = set(get_edges(graph_2))
-	if edges_1 != edges_2:
-		return False
+	for key in graph_1.edge_keys:
+		if not graph_2.has_edge_key(key):
+			return False
 
 	return True
 
-# Returns whether the first given graph is a subgraph of the second
-def is_subgraph(graph_1, graph_2):
-	edges_1 = set(get_edges(graph_1))
-	edges_2 = set(get_edges(graph_2))
+# Returns the content hash of the graph's edge set (see Graph.fingerprint)
+def get_fingerprint(graph):
+	return graph.fingerprint()
 
-	return edges_1 <= edges_2
 
+# Returns a dictionary from graph fingerprint to the leafiest of the given
+# trees for that graph, so a graph's known solution can be found in O(E)
+# NOTE: the tree at index i must be a spanning tree of the graph at index i
+def create_solution_index(graphs, trees):
+	solution_index = {}
 
-# Returns a list of nodes in the graph
-def get_nodes(graph):
-	nodes = set()
-	edges = get_edges(graph)
+	for graph, tree in zip(graphs, trees):
+		fingerprint = get_fingerprint(graph)
+		known_tree = solution_index.get(fingerprint)
+		if known_tree is None or len(get_leaves(tree)) > len(get_leaves(known_tree)):
+			solution_index[fingerprint] = tree
+
+	return solution_index
 
-	for edge in edges:
-		nodes.add(edge.ends[0])
-		nodes.add(edge.ends[1])
 
-	return list(nodes)
+# Returns whether the first given graph is a subgraph of the second
+def is_subgraph(graph_1, graph_2):
+	for key in graph_1.edge_keys:
+		if not graph_2.has_edge_key(key):
+			return False
 
+	return True
 
-# Returns a list of edges in the graph
-def get_edges(graph):
-	number_of_nodes = len(graph.neighbors)
-	edge_set = set()
 
-	for current_node in range(0, number_of_nodes):
-		for adjacent_node in graph.neighbors[current_node]:
-			edge_set.add(Edge(current_node, adjacent_node))
+# Returns a read-only view of the nodes in the graph
+def get_nodes(graph):
+	return graph.nodes
+
 
-	return list(edge_set)
+# Returns a read-only view of the edges in the graph
+def get_edges(graph):
+	return graph.edges
 
 
 # Returns a list of edges not used in the graph.
@@ -74,61 +78,62 @@ def get_unused_edges(graph):
 
 # Returns a list of edges in the graph but not in its subgraph
 def get_edge_difference(graph, subgraph):
-	graph_edges = get_edges(graph)
-	subgraph_edges = set(get_edges(subgraph))
 	edge_difference = []
 
-	for edge in graph_edges:
-		if edge not in subgraph_edges:
-			edge_difference.append(edge)
+	for key in graph.edge_keys:
+		if not subgraph.has_edge_key(key):
+			edge_difference.append(Edge.from_key(key))
 
 	return edge_difference
 
 
-# Returns a list of all nodes in the tree that are leaves (degree one)
+# Returns a read-only view of all nodes in the tree that are leaves (degree one)
 def get_leaves(tree):
-	leaves = []
-	for node in range(0, len(tree.neighbors)):
-		if len(tree.neighbors[node]) == 1:
-			leaves.append(node)
-
-	return leaves
+	return tree.leaves
 
 
 # Returns a deep copy of the given graph
 def create_copy(graph):
-	edges = get_edges(graph)
-	return make_graph(edges)
+	return make_graph_from_keys(graph.edge_keys)
 
 
 # Returns whether the given graph is a tree
 def is_tree(graph):
-	number_of_nodes = len(get_nodes(graph))
-	number_of_edges = len(get_edges(graph))
+	number_of_nodes = len(graph.nodes)
+	number_of_edges = graph.num_edges()
 	return number_of_edges == number_of_nodes - 1
 
 
+# Returns an upper bound on the number of leaves in any spanning tree of the graph
+# A spanning tree with k internal nodes has n - 1 edges, so the tree degrees of its
+# internal nodes add up to n + k - 2. That sum cannot exceed the k largest degrees
+# in the graph, so k is at least the smallest k for which they are large enough.
+def get_leaf_upper_bound(graph):
+	number_of_nodes = len(graph.nodes)
+	if number_of_nodes <= 2:
+		return number_of_nodes
+	if is_tree(graph):
+		return len(graph.leaves)
+
+	degrees = sorted((graph.degree(node) for node in graph.nodes), reverse=True)
+	degree_sum = 0
+	for internal_count in range(1, number_of_nodes):
+		degree_sum += degrees[internal_count - 1]
+		if degree_sum >= number_of_nodes + internal_count - 2:
+			return number_of_nodes - internal_count
+
+	return 0
+
+
 # Returns whether the given graph is a line
 def is_line(graph):
 	# If not a tree, no chance it's a line
 	if not is_tree(graph):
 		return False
 
-	# Graph is a line iff it is a tree with two nodes having degree 1 and all
-	# others having degree 2
-	nodes = get_nodes(graph)
-	leaf_count = 0
-	for node in nodes:
-		degree = len(graph.neighbors[node])
-		if degree == 1:
-			leaf_count += 1
-			if leaf_count > 2:
-				return False
-		elif degree != 2:
-			return False
-
-	# Passed tests; graph is a line
-	return True
+	# Graph is a line iff it is a tree with exactly two nodes having degree 1
+	# (the remaining nodes of such a tree must all have degree 2)
+	return len(graph.leaves) == 2
 
 
 # Plots a graph
@@ -3,94 +3,531 @@ from graph_helper import *
 from constants import *
 from input_output import *
 from solver_algorithms import *
+from solution_store import *
+from local_search import *
+from instrumentation import *
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from itertools import islice
+import os
+import random
+import time
 
 """
 This file extracts leafy spanning trees from graphs, for part 2 of the MLST project.
 """
 
 # Takes in files from default input, solves them using all algorithms, logs their
-# performance onto the console, writes the solutions into a file, and merges the
-# solutions from this run with the solutions from the existing file to generate
-# the best solution thus far
+# performance onto the console, and records every improved solution in the
+# solution store (seeded from the existing output file on first use)
+# Graphs are read from the input file as they are solved (see
+# find_leafy_spanning_trees_in_file), so only seeding the store loads them all.
 def do_everything():
-	graphs = input_graphs_from_file(ALL_GRAPHS_INPUT)
-	trees = find_leafy_spanning_trees(graphs)
-	output_graphs_to_new_file(trees, TEMPORARY_TREES_OUTPUT)
-	merge_solutions(ALL_TREES_OUTPUT, TEMPORARY_TREES_OUTPUT, ALL_TREES_OUTPUT)
+	with SolutionStore(SOLUTION_STORE) as solution_store:
+		if len(solution_store) == 0 and os.path.exists(ALL_TREES_OUTPUT):
+			seed_solution_store(solution_store)
+		find_leafy_spanning_trees_in_file(ALL_GRAPHS_INPUT, solution_store, NUMBER_OF_WORKERS, WORKER_CHUNK_SIZE)
+
+
+# Imports the trees in the default output file into an empty solution store
+def seed_solution_store(solution_store):
+	graphs = input_graphs_from_file(ALL_GRAPHS_INPUT, use_cache=True, relabel=True)
+	solution_store.import_solutions(graphs, input_graphs_from_file(ALL_TREES_OUTPUT), 'imported from ' + ALL_TREES_OUTPUT)
+
+
+# Writes the best solutions in the solution store to the default output file
+def export_solutions():
+	graphs = input_graphs_from_file(ALL_GRAPHS_INPUT, use_cache=True, relabel=True)
+	with SolutionStore(SOLUTION_STORE) as solution_store:
+		solution_store.export(graphs, ALL_TREES_OUTPUT)
+
+
+# Solves the graphs in the given file as do_everything does, without a solution store,
+# and writes a record of every algorithm run on every instance to records_file_name
+# (see instrumentation.py). If profile_file_name is given, a cProfile of the whole run
+# is saved there; it only covers this process, so it is most useful with one worker,
+# and the algorithms of each instance then run one after another in this process
+# rather than racing in portfolio workers.
+def profile_algorithms(graphs_file_name=ALL_GRAPHS_INPUT, records_file_name=INSTRUMENTATION_RECORDS, profile_file_name=None, time_helpers=False, workers=1):
+	portfolio_workers = 1 if profile_file_name is not None else PORTFOLIO_WORKERS
+	with Instrumentation(time_helpers=time_helpers, profile_file_name=profile_file_name) as instrumentation:
+		find_leafy_spanning_trees_in_file(graphs_file_name, workers=workers, instrumentation=instrumentation, portfolio_workers=portfolio_workers)
+	instrumentation.write(records_file_name)
 
 
 # Takes a list of graphs and returns the leafiest spanning tree we can find
 # by running them through all of our algorithms
-def find_leafy_spanning_trees(graphs):
+# If a solution store is given, improved solutions are recorded in it
+# If an output file name is given, trees are streamed to that file (in the order of the
+# given graphs) as they are solved; it is replaced once every tree is written
+# If an Instrumentation is given, every algorithm run is recorded in it
+# With more than one worker (None uses every core), instances are solved in a pool
+# of processes, chunk_size instances at a time; the returned trees keep the order
+# of the given graphs, and are numbered like them (see relabel_like)
+# With one worker, each instance's algorithms race in portfolio_workers processes (see
+# run_portfolio); in a pool, they run one after another in the instance's worker.
+def find_leafy_spanning_trees(graphs, solution_store=None, workers=1, chunk_size=WORKER_CHUNK_SIZE, output_file_name=None, instrumentation=None, portfolio_workers=PORTFOLIO_WORKERS):
+	if workers != 1:
+		return find_leafy_spanning_trees_in_parallel(graphs, solution_store, workers, chunk_size, output_file_name, instrumentation)
 
-	# Initialize our graph-tree pairs
-	our_graphs = input_graphs_from_file(OUR_GRAPHS)
-	our_trees = input_graphs_from_file(OUR_TREES)
-
-	# Initialize manually-solved graph-tree pairs
-	manually_solved_graphs = input_graphs_from_file(MANUALLY_SOLVED_GRAPHS)
-	manually_solved_trees = input_graphs_from_file(MANUALLY_SOLVED_TREES)
+	our_solutions, manually_solved_solutions = load_known_solutions()
 
 	leafy_spanning_trees = []
 
-	for i in range(len(graphs)):
-		best_tree = find_leafy_spanning_tree(graphs[i], i, our_graphs, our_trees, manually_solved_graphs, manually_solved_trees)
-		leafy_spanning_trees.append(best_tree)
+	with open_output_writer(output_file_name, len(graphs)) as writer:
+		for i in range(len(graphs)):
+			best_tree = find_leafy_spanning_tree(graphs[i], i, our_solutions, manually_solved_solutions, solution_store, instrumentation=instrumentation, portfolio_workers=portfolio_workers)
+			leafy_spanning_trees.append(best_tree)
+			if writer is not None:
+				writer.write(best_tree)
 
 	return leafy_spanning_trees
 
 
+# Solves the graphs in the given text file as find_leafy_spanning_trees does, holding
+# only the graphs being worked on in memory rather than the whole file
+# Graphs are read one at a time (see iterate_graphs_from_file) and relabeled. In a pool
+# of workers, each worker reads its own chunk of the file (see index_graphs_in_file),
+# and this process reads the chunk again when its trees come back, to record them.
+# Trees are not returned: they go to the solution store and the output file (if any),
+# and only trees solved ahead of an unsolved one are held until they can be written.
+def find_leafy_spanning_trees_in_file(file_name, solution_store=None, workers=1, chunk_size=WORKER_CHUNK_SIZE, output_file_name=None, instrumentation=None, portfolio_workers=PORTFOLIO_WORKERS):
+	byte_offsets = index_graphs_in_file(file_name)
+	number_of_graphs = len(byte_offsets)
+
+	if workers == 1:
+		our_solutions, manually_solved_solutions = load_known_solutions()
+		with open_output_writer(output_file_name, number_of_graphs) as writer:
+			for i, graph in enumerate(iterate_graphs_from_file(file_name)):
+				best_tree = find_leafy_spanning_tree(relabel_graph(graph), i, our_solutions, manually_solved_solutions, solution_store, instrumentation=instrumentation, portfolio_workers=portfolio_workers)
+				if writer is not None:
+					writer.write(best_tree)
+		return
+
+	number_solved = 0
+	unwritten_trees = {}
+	instrumentation_settings = instrumentation.worker_settings() if instrumentation is not None else None
+
+	with open_output_writer(output_file_name, number_of_graphs) as writer, ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker) as executor:
+		chunk_starts = {}
+		for start in range(0, number_of_graphs, chunk_size):
+			size = min(chunk_size, number_of_graphs - start)
+			future = executor.submit(solve_chunk_in_file, file_name, start, byte_offsets[start], size, instrumentation_settings)
+			chunk_starts[future] = start
+
+		# Log instances as their chunks finish, in whatever order that happens
+		for future in as_completed(chunk_starts):
+			solutions, records = future.result()
+			if instrumentation is not None:
+				instrumentation.records.extend(records)
+
+			start = chunk_starts.pop(future)
+			graphs = islice(iterate_graphs_from_file(file_name, start, byte_offsets[start]), len(solutions))
+			for (i, tree_bytes, algorithm, seconds), graph in zip(solutions, graphs):
+				graph = relabel_graph(graph)
+				best_tree, algorithm = collect_solution(graph, tree_bytes, algorithm, seconds, solution_store)
+				number_solved += 1
+				log_solution(i, len(get_leaves(best_tree)), len(get_nodes(graph)), algorithm + '\t(' + str(number_solved) + ' / ' + str(number_of_graphs) + ' solved)')
+
+				# Trees are written in order, so write every tree up to the first unsolved one
+				if writer is not None:
+					unwritten_trees[i] = best_tree
+					while writer.number_written in unwritten_trees:
+						writer.write(unwritten_trees.pop(writer.number_written))
+
+
+# Returns a GraphFileWriter for the output file, or a context holding None if there is none
+def open_output_writer(output_file_name, number_of_graphs):
+	if output_file_name is None:
+		return nullcontext()
+	return GraphFileWriter(output_file_name, number_of_graphs)
+
+
+# Returns our own and manually-solved graph-tree pairs, each indexed by graph fingerprint
+def load_known_solutions():
+	our_solutions = create_solution_index(input_graphs_from_file(OUR_GRAPHS, use_cache=True), input_graphs_from_file(OUR_TREES, use_cache=True))
+	manually_solved_solutions = create_solution_index(input_graphs_from_file(MANUALLY_SOLVED_GRAPHS, use_cache=True), input_graphs_from_file(MANUALLY_SOLVED_TREES, use_cache=True))
+	return our_solutions, manually_solved_solutions
+
+
+# Solves the graphs as find_leafy_spanning_trees does, in a pool of worker processes
+# Graphs and trees travel between processes as packed edge arrays in original node IDs
+# (see Graph.to_bytes), and workers relabel the graphs they solve; the solution store
+# is only used from this process, and workers send their instrumentation records back
+# with their trees
+def find_leafy_spanning_trees_in_parallel(graphs, solution_store=None, workers=None, chunk_size=WORKER_CHUNK_SIZE, output_file_name=None, instrumentation=None):
+	leafy_spanning_trees = [None] * len(graphs)
+	number_solved = 0
+	instrumentation_settings = instrumentation.worker_settings() if instrumentation is not None else None
+
+	with open_output_writer(output_file_name, len(graphs)) as writer, ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker) as executor:
+		futures = []
+		for start in range(0, len(graphs), chunk_size):
+			chunk = [(i, graphs[i].to_bytes()) for i in range(start, min(start + chunk_size, len(graphs)))]
+			futures.append(executor.submit(solve_chunk, chunk, instrumentation_settings))
+
+		# Log instances as their chunks finish, in whatever order that happens
+		for future in as_completed(futures):
+			solutions, records = future.result()
+			if instrumentation is not None:
+				instrumentation.records.extend(records)
+
+			for i, tree_bytes, algorithm, seconds in solutions:
+				graph = graphs[i]
+				best_tree, algorithm = collect_solution(graph, tree_bytes, algorithm, seconds, solution_store)
+				leafy_spanning_trees[i] = best_tree
+				number_solved += 1
+				log_solution(i, len(get_leaves(best_tree)), len(get_nodes(graph)), algorithm + '\t(' + str(number_solved) + ' / ' + str(len(graphs)) + ' solved)')
+
+				# Trees are written in order, so write every tree up to the first unsolved one
+				if writer is not None:
+					while writer.number_written < len(graphs) and leafy_spanning_trees[writer.number_written] is not None:
+						writer.write(leafy_spanning_trees[writer.number_written])
+
+	return leafy_spanning_trees
+
+
+# Takes the packed tree a worker found for the graph with the given algorithm, records
+# it in the solution store (if any), and returns the best tree for the graph and the
+# algorithm that found it: the worker's tree, or the store's best if that has more
+# leaves, numbered like the graph
+def collect_solution(graph, tree_bytes, algorithm, seconds, solution_store=None):
+	best_tree = relabel_like(make_graph_from_bytes(tree_bytes), graph)
+	if solution_store is not None:
+		solution_store.record(graph, best_tree, algorithm, seconds)
+		stored_solution = solution_store.best_solution(graph)
+		if stored_solution[1] > len(get_leaves(best_tree)):
+			best_tree, _, algorithm, _ = stored_solution
+			best_tree = relabel_like(best_tree, graph)
+	return best_tree, algorithm
+
+
+# Known solutions of the current worker process, loaded once by initialize_worker
+worker_known_solutions = None
+
+
+# Prepares a worker process of find_leafy_spanning_trees_in_parallel or
+# find_leafy_spanning_trees_in_file
+def initialize_worker():
+	global worker_known_solutions
+	worker_known_solutions = load_known_solutions()
+
+	# Forked workers inherit the parent's random state; give each its own
+	random.seed()
+
+
+# Solves a chunk of (instance number, packed graph) pairs in a worker process, and
+# returns a list of (instance number, packed tree, algorithm name, seconds) for each,
+# and the records of an Instrumentation with the given settings (if any)
+def solve_chunk(chunk, instrumentation_settings=None):
+	return solve_numbered_graphs(((i, make_graph_from_bytes(graph_bytes)) for i, graph_bytes in chunk), instrumentation_settings)
+
+
+# Solves as solve_chunk does the size graphs that start with graph number start, which
+# begins at byte_offset in the given text file; they are read one at a time
+def solve_chunk_in_file(file_name, start, byte_offset, size, instrumentation_settings=None):
+	graphs = islice(iterate_graphs_from_file(file_name, start, byte_offset), size)
+	return solve_numbered_graphs(enumerate(graphs, start), instrumentation_settings)
+
+
+# Solves the graphs in (instance number, graph) pairs for solve_chunk
+def solve_numbered_graphs(numbered_graphs, instrumentation_settings=None):
+	our_solutions, manually_solved_solutions = worker_known_solutions
+	results = []
+
+	instrumentation = Instrumentation(*instrumentation_settings) if instrumentation_settings is not None else None
+	with instrumentation if instrumentation is not None else nullcontext():
+		for i, graph in numbered_graphs:
+			graph = relabel_graph(graph)
+			best_solution = SolutionRecord()
+			find_leafy_spanning_tree(graph, i, our_solutions, manually_solved_solutions, best_solution, verbose=False, instrumentation=instrumentation, portfolio_workers=1)
+			results.append((i, best_solution.tree.to_bytes(), best_solution.algorithm, best_solution.seconds))
+
+	return results, (instrumentation.records if instrumentation is not None else [])
+
+
+# Stands in for a SolutionStore in worker processes: holds the one solution
+# that find_leafy_spanning_tree records
+class SolutionRecord:
+
+	def __init__(self):
+		self.tree = None
+		self.algorithm = ''
+		self.seconds = 0.0
+
+	def best_solution(self, graph):
+		return None
+
+	def record(self, graph, tree, algorithm, seconds=0.0):
+		self.tree = tree
+		self.algorithm = algorithm
+		self.seconds = seconds
+		return True
+
+
+# Runs every (name, algorithm) pair on the graph, each under its own wall-clock and
+# iteration budget and all under a deadline for the whole instance, and returns a list
+# of (name, tree, seconds) for the algorithms that produced a tree, numbered like the graph
+# Algorithms are given a deadline PORTFOLIO_DEADLINE_MARGIN of the instance time earlier,
+# so that they can return their best tree so far in time. If none does, the list holds
+# a tree of joined_forest_tree run without a budget, so it is never empty.
+# The race stops early once some tree reaches leaf_upper_bound leaves. With more than
+# one worker (None means one per algorithm), algorithms run concurrently in the
+# processes of the shared PortfolioPool, whose workers are recycled if any are still
+# running when the race ends.
+# If an Instrumentation is given, every algorithm run is recorded in it as instance
+# graph_number
+def run_portfolio(graph, algorithms, leaf_upper_bound=None, seconds=ALGORITHM_TIME_BUDGET, iterations=ALGORITHM_ITERATION_BUDGET, instance_seconds=INSTANCE_TIME_BUDGET, workers=PORTFOLIO_WORKERS, instrumentation=None, graph_number=0):
+	deadline = time.time() + instance_seconds if instance_seconds is not None else None
+	algorithm_deadline = deadline - PORTFOLIO_DEADLINE_MARGIN * instance_seconds if deadline is not None else None
+	results = []
+
+	def reaches_upper_bound(tree):
+		return leaf_upper_bound is not None and len(get_leaves(tree)) >= leaf_upper_bound
+
+	if workers is None:
+		workers = len(algorithms)
+
+	if workers == 1:
+		for algorithm_name, algorithm in algorithms:
+			if deadline is not None and time.time() >= deadline:
+				break
+
+			budget = Budget(seconds, iterations, algorithm_deadline)
+			start_time = time.time()
+			tree = run_measured(instrumentation, graph_number, algorithm_name, graph, budget, algorithm, graph, budget)
+			if tree is None:
+				continue
+			tree.labels = graph.labels
+
+			results.append((algorithm_name, tree, time.time() - start_time))
+			if reaches_upper_bound(tree):
+				break
+
+		return results or [run_fallback(graph, instrumentation, graph_number)]
+
+	pool = get_portfolio_pool(workers)
+	pending = {}
+	try:
+		graph_bytes = graph.to_bytes()
+		instrumentation_settings = instrumentation.worker_settings() if instrumentation is not None else None
+		for algorithm_name, algorithm in algorithms:
+			future = pool.submit(run_algorithm, algorithm, graph_bytes, seconds, iterations, algorithm_deadline, algorithm_name, graph_number, instrumentation_settings)
+			pending[future] = algorithm_name
+
+		while pending:
+			timeout = max(0, deadline - time.time()) if deadline is not None else None
+			done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+			if not done:
+				break
+
+			for future in done:
+				algorithm_name = pending.pop(future)
+				tree_bytes, algorithm_seconds, record = future.result()
+				if record is not None:
+					instrumentation.records.append(record)
+				if tree_bytes is not None:
+					results.append((algorithm_name, relabel_like(make_graph_from_bytes(tree_bytes), graph), algorithm_seconds))
+
+			if any(reaches_upper_bound(tree) for _, tree, _ in results):
+				break
+	finally:
+		pool.abandon(pending)
+
+	return results or [run_fallback(graph, instrumentation, graph_number)]
+
+
+# Returns (name, tree, seconds) of joined_forest_tree run on the graph without a budget,
+# for run_portfolio when no algorithm returned a tree in time
+def run_fallback(graph, instrumentation=None, graph_number=0):
+	algorithm_name = 'joined forest tree (fallback)'
+	start_time = time.time()
+	tree = run_measured(instrumentation, graph_number, algorithm_name, graph, None, joined_forest_tree, graph)
+	tree.labels = graph.labels
+	return algorithm_name, tree, time.time() - start_time
+
+
+# The PortfolioPool of run_portfolio, created on first use
+portfolio_pool = None
+
+
+# Returns the shared PortfolioPool, with the given number of workers
+def get_portfolio_pool(workers):
+	global portfolio_pool
+	if portfolio_pool is None or portfolio_pool.workers != workers:
+		if portfolio_pool is not None:
+			portfolio_pool.close()
+		portfolio_pool = PortfolioPool(workers)
+	return portfolio_pool
+
+
+# A pool of worker processes that run portfolio algorithms, kept from one instance to
+# the next. Algorithms only check their budgets now and then, so the workers running
+# ones abandoned at a deadline are terminated, and new workers are started on the
+# next submit.
+class PortfolioPool:
+
+	def __init__(self, workers):
+		self.workers = workers
+		self.executor = None
+
+	# Submits function(*arguments) to a worker, and returns its future
+	def submit(self, function, *arguments):
+		if self.executor is None:
+			self.executor = ProcessPoolExecutor(max_workers=self.workers)
+		return self.executor.submit(function, *arguments)
+
+	# Cancels the given futures, and recycles the workers if any of them is running
+	def abandon(self, futures):
+		running = [future for future in futures if not future.cancel() and not future.done()]
+		if running:
+			self.recycle()
+
+	# Terminates every worker, abandoning whatever it is running
+	def recycle(self):
+		if self.executor is None:
+			return
+		processes = list((self.executor._processes or {}).values())
+		self.executor.shutdown(wait=False, cancel_futures=True)
+		for process in processes:
+			process.terminate()
+		for process in processes:
+			process.join()
+		self.executor = None
+
+	# Shuts the workers down once they finish what they are running
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+
+
+# Runs one portfolio algorithm on a packed graph (relabeled) in a worker process, and returns
+# the packed tree (or None), the time it took, and its record from an Instrumentation
+# with the given settings (or None)
+def run_algorithm(algorithm, graph_bytes, seconds, iterations, deadline, algorithm_name='', graph_number=0, instrumentation_settings=None):
+	graph = relabel_graph(make_graph_from_bytes(graph_bytes))
+	budget = Budget(seconds, iterations, deadline)
+	start_time = time.time()
+	if instrumentation_settings is None:
+		tree = algorithm(graph, budget)
+		record = None
+	else:
+		with Instrumentation(*instrumentation_settings) as instrumentation:
+			tree = instrumentation.measure(graph_number, algorithm_name, graph, budget, algorithm, graph, budget)
+		record = instrumentation.records[0]
+	algorithm_seconds = time.time() - start_time
+	if tree is not None:
+		tree.labels = graph.labels
+	return (tree.to_bytes() if tree is not None else None), algorithm_seconds, record
+
+
+# Returns function(*arguments), recorded by the instrumentation (if any) as a run of
+# the named algorithm on the instance, with the given budget
+def run_measured(instrumentation, graph_number, algorithm_name, graph, budget, function, *arguments):
+	if instrumentation is None:
+		return function(*arguments)
+	return instrumentation.measure(graph_number, algorithm_name, graph, budget, function, *arguments)
+
+
+# Logs the best solution for an instance onto the console
+def log_solution(graph_number, leaf_count, node_count, algorithm):
+	print('Best solution for instance ' + str(graph_number) + ':\tLeaves: ' + str(leaf_count) + '\t/\t' + str(node_count) + '\tAlgorithm: ' + algorithm)
+
+
 # Takes a graph and returns the leafiest spanning tree we can find by running
 # it through all of our algorithms
-# For best results, also provide our own graph-tree pairs and manually-solved pairs
-def find_leafy_spanning_tree(graph, graph_number=0, our_graphs=[], our_trees=[], manually_solved_graphs=[], manually_solved_trees=[]):
+# For best results, also provide our own and manually-solved solutions, indexed by
+# graph fingerprint (see create_solution_index)
+# If a solution store is given, its record for the graph is the best so far, and the
+# best tree is recorded in it if it improves on that record
+# If verbose, the best solution is logged onto the console
+# If an Instrumentation is given, every algorithm and local search run is recorded in it
+# The algorithms race in portfolio_workers processes (see run_portfolio), and their
+# trees are then improved by local search; both are given instance_seconds in all
+# The graph may be relabeled (see relabel_graph); known and stored trees are relabeled
+# like it, and the returned tree is numbered like it
+def find_leafy_spanning_tree(graph, graph_number=0, our_solutions={}, manually_solved_solutions={}, solution_store=None, verbose=True, instrumentation=None, portfolio_workers=PORTFOLIO_WORKERS, instance_seconds=INSTANCE_TIME_BUDGET):
 
 	# Maintain a record of bests so far
 	best_tree = None
 	best_leaf_count = 0
 	best_algorithm = ''
+	best_seconds = 0.0
+
+	fingerprint = get_fingerprint(graph)
+
+	# Start from the stored solution
+	if solution_store is not None:
+		stored_solution = solution_store.best_solution(graph)
+		if stored_solution is not None:
+			best_tree, best_leaf_count, best_algorithm, best_seconds = stored_solution
+			best_tree = relabel_like(best_tree, graph)
 
 	# Test for graph generated by us
-	for i in range(len(our_graphs)):
-		if are_equivalent_graphs(graph, our_graphs[i]):
-			our_trees[i].search()
-			best_tree = our_trees[i]
-			best_leaf_count = our_trees[i].num_leaves
+	if fingerprint in our_solutions:
+		our_tree = our_solutions[fingerprint]
+		if our_tree.num_leaves > best_leaf_count:
+			best_tree = relabel_like(our_tree, graph)
+			best_leaf_count = our_tree.num_leaves
 			best_algorithm = 'our own solution'
 
 	# Test for line
 	if is_line(graph):
-		print('Best solution for instance ' + str(graph_number) + ':\tLeaves: ' + str(len(get_leaves(graph))) + '\t/\t' + str(len(get_nodes(graph))) + '\tAlgorithm: detected line')
+		if verbose:
+			log_solution(graph_number, len(get_leaves(graph)), len(get_nodes(graph)), 'detected line')
+		if solution_store is not None:
+			solution_store.record(graph, graph, 'detected line')
 		return graph
 
 	# Test for tree
 	if is_tree(graph):
-		print('Best solution for instance ' + str(graph_number) + ':\tLeaves: ' + str(len(get_leaves(graph))) + '\t/\t' + str(len(get_nodes(graph))) + '\tAlgorithm: detected tree')
+		if verbose:
+			log_solution(graph_number, len(get_leaves(graph)), len(get_nodes(graph)), 'detected tree')
+		if solution_store is not None:
+			solution_store.record(graph, graph, 'detected tree')
 		return graph
 
 	# Test for small input size
 	if len(get_edges(graph)) < SMALL_NUMBER_OF_EDGES:
-		for i in range(len(manually_solved_graphs)):
-			if are_equivalent_graphs(graph, manually_solved_graphs[i]):
-				solved_tree = manually_solved_trees[i]
-				solved_tree.search()
-				if solved_tree.num_leaves > best_leaf_count:
-					best_tree = solved_tree
-					best_leaf_count = solved_tree.num_leaves
-					best_algorithm = 'manually solved'
-
-	# Try all algorithms and record the best one
-	for algorithm_name, algorithm in ALGORITHMS:
-		tree = algorithm(graph)
-		tree.search()
-
-		if tree.num_leaves > best_leaf_count:
-			best_tree = tree
-			best_leaf_count = tree.num_leaves
-			best_algorithm = algorithm_name
+		if fingerprint in manually_solved_solutions:
+			solved_tree = manually_solved_solutions[fingerprint]
+			if solved_tree.num_leaves > best_leaf_count:
+				best_tree = relabel_like(solved_tree, graph)
+				best_leaf_count = solved_tree.num_leaves
+				best_algorithm = 'manually solved'
+
+	# Race all algorithms, unless the best tree so far is provably optimal
+	leaf_upper_bound = get_leaf_upper_bound(graph)
+	if best_leaf_count < leaf_upper_bound:
+		instance_deadline = time.time() + instance_seconds
+		for algorithm_name, tree, seconds in run_portfolio(graph, ALGORITHMS, leaf_upper_bound, instance_seconds=instance_seconds, workers=portfolio_workers, instrumentation=instrumentation, graph_number=graph_number):
+
+			# Improve each algorithm's tree by local search, while the instance has time left
+			budget = Budget(LOCAL_SEARCH_TIME_BUDGET, deadline=instance_deadline)
+			if not budget.exhausted():
+				start_time = time.time()
+				improved_tree = run_measured(instrumentation, graph_number, 'local search on ' + algorithm_name, graph, budget, improve_tree, graph, tree, budget)
+				seconds += time.time() - start_time
+				if len(get_leaves(improved_tree)) > len(get_leaves(tree)):
+					tree = improved_tree
+					algorithm_name += ' + local search'
+
+			leaf_count = len(get_leaves(tree))
+
+			if leaf_count > best_leaf_count:
+				best_tree = tree
+				best_leaf_count = leaf_count
+				best_algorithm = algorithm_name
+				best_seconds = seconds
 
 	# Log the best solution
-	print('Best solution for instance ' + str(graph_number) + ':\tLeaves: ' + str(best_leaf_count) + '\t/\t' + str(len(get_nodes(graph))) + '\tAlgorithm: ' + best_algorithm)
+	if verbose:
+		log_solution(graph_number, best_leaf_count, len(get_nodes(graph)), best_algorithm)
+
+	# Record the best solution if it improved
+	if solution_store is not None:
+		solution_store.record(graph, best_tree, best_algorithm, best_seconds)
 
 	return best_tree
 
@@ -1,82 +1,550 @@
 from graph import *
 from graph_helper import *
 from constants import *
-from collections import deque
+from array import array
+from contextlib import closing, contextmanager
+import config
+import hashlib
+import mmap
+import numpy as np
+import os
+import re
+import reader
+import struct
+import sys
 
 """
 This file contains functions for reading graphs from files and writing them to files.
 """
 
 # Reads and returns all graphs in the given text file
+# If use_cache, the graphs are loaded from the file's binary cache when that is up to
+# date, and the cache is written after parsing otherwise (see load_graphs_from_cache).
+# Caches are only written on request, for files read again and again, like the solver's.
+# The file is memory-mapped and parsed one graph at a time with NumPy, straight from
+# the map; each graph is built from its (M, 2) block of edge ends. If any line is not
+# in canonical form, the file is read a line at a time by iterate_graphs_from_file,
+# which ignores whatever follows the last graph (such as blank lines). Only a file it
+# cannot read goes through the strict reader from reader.py, to raise a GraphFileError
+# naming the line at fault.
+# If relabel, each graph's nodes are renumbered 0..n-1 as it is built (see
+# relabel_graph), so its per-node arrays and scans are O(n) whatever its node IDs are;
+# its original IDs are restored whenever it is written out.
 # NOTE: Graphs must be in format given by instructors
-def input_graphs_from_file(file_name):
+def input_graphs_from_file(file_name, use_cache=False, relabel=False):
+	if use_cache:
+		graphs = load_graphs_from_cache(file_name, relabel)
+		if graphs is not None:
+			return graphs
 
-	# Read in raw lines
-	with open(file_name) as input_file:
-		raw_lines = input_file.readlines()
+	graphs = parse_graphs_in_file(file_name, relabel)
 
-	# Strip newline from each line
-	for i in range(len(raw_lines)):
-		raw_lines[i] = raw_lines[i].strip()
+	if use_cache:
+		save_graphs_to_cache(file_name, graphs)
 
-	# Store lines in a queue (using deque) for efficient processing
-	lines = deque(raw_lines)
+	return graphs
 
-	# Maintain a list of graphs
-	graphs = []
 
-	# Read the number of graphs in file
-	if len(lines) > 0:
-		number_of_graphs = int(lines.popleft())
-	else:
-		return []
+# Parses and returns all graphs in the given text file (see input_graphs_from_file)
+def parse_graphs_in_file(file_name, relabel=False):
+	with open(file_name, 'rb') as input_file:
+		if os.fstat(input_file.fileno()).st_size == 0:
+			return []
+		with closing(mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+			graphs = parse_graphs(data, relabel)
+
+	if graphs is None:
+		try:
+			graphs = list(iterate_graphs_from_file(file_name))
+		except ValueError as error:
+			check_graphs_in_file(file_name)
+			raise GraphFileError('(' + file_name + ') ' + str(error))
+		if relabel:
+			graphs = [relabel_graph(graph) for graph in graphs]
+
+	return graphs
 
-	# Read lines in nested structure
+
+# Longest edge line in canonical form: two node IDs of up to 10 digits, a space and a
+# line break
+MAXIMUM_EDGE_LINE_LENGTH = 22
+
+# Character codes of the canonical form
+LINE_BREAK = ord('\n')
+SPACE = ord(' ')
+DIGIT_ZERO = ord('0')
+DIGIT_NINE = ord('9')
+
+
+# Parses the contents of a text file of graphs (bytes or a memory map) one graph at a
+# time, relabeling each graph if relabel
+# Returns the graphs, or None unless every line is in canonical form: each count alone
+# on its line, each edge as two numbers separated by a single space, and nothing else.
+# The strict reader decides about files that are not.
+def parse_graphs(data, relabel=False):
+	characters = np.frombuffer(data, dtype=np.uint8)
+	number_of_graphs, position = parse_count_line(data, 0)
+	if number_of_graphs is None:
+		return None
+
+	graphs = []
 	for _ in range(number_of_graphs):
-		edges = []
-		number_of_edges = int(lines.popleft())
+		number_of_edges, position = parse_count_line(data, position)
+		if number_of_edges is None:
+			return None
+		edge_ends, position = parse_edge_lines(characters, position, number_of_edges)
+		if edge_ends is None:
+			return None
 
-		for _ in range(number_of_edges):
-			edge_ends = lines.popleft().split()
-			u = int(edge_ends[0])
-			v = int(edge_ends[1])
-			edges.append(Edge(u, v))
+		# Check node range and self-loops in bulk
+		if number_of_edges > 0:
+			if edge_ends.max() > MAX_NODE_ID:
+				return None
+			if (edge_ends[:, 0] == edge_ends[:, 1]).any():
+				return None
+
+		# Duplicated edges are left to the strict reader
+		try:
+			graph = make_graph_from_ends(edge_ends, relabel)
+		except ValueError:
+			return None
 
-		graph = make_graph(edges)
 		graphs.append(graph)
 
+	# Nothing may follow the last graph
+	if position != len(data):
+		return None
+
 	return graphs
 
 
-# Outputs several graphs to a text file in the format given by instructors
-# NOTE: Overwrites existing file with same name
-def output_graphs_to_new_file(graphs, file_name):
-	output_file = open(file_name, 'w')
+# Parses the line holding one count at the given position of a text file's contents
+# Returns the count and the position of the next line, or (None, position) if the line
+# is not a natural number alone
+def parse_count_line(data, position):
+	end = data.find(b'\n', position)
+	if end == -1:
+		end = len(data)
+	line = data[position:end]
+	if not line.isdigit():
+		return None, position
+	return int(line), min(end + 1, len(data))
+
+
+# Parses the given number of edge lines at the given position of a text file's
+# characters (a NumPy byte array), reading only the bytes those lines can span
+# Returns their (M, 2) array of edge ends and the position of the next line, or
+# (None, position) if they are not all in canonical form.
+def parse_edge_lines(characters, position, number_of_edges):
+	if number_of_edges == 0:
+		return np.empty((0, 2), dtype=np.int64), position
+
+	region = characters[position:position + MAXIMUM_EDGE_LINE_LENGTH * number_of_edges]
+	line_breaks = np.flatnonzero(region == LINE_BREAK)
+	if len(line_breaks) >= number_of_edges:
+		block = region[:line_breaks[number_of_edges - 1] + 1]
+	elif len(line_breaks) == number_of_edges - 1 and position + len(region) == len(characters):
+		# The last line of the file need not end in a line break
+		block = region
+	else:
+		return None, position
+
+	# Separators must alternate between a space and a line break, with at least one
+	# digit between any two of them
+	separators = np.flatnonzero(block < DIGIT_ZERO)
+	if len(separators) not in (2 * number_of_edges, 2 * number_of_edges - 1) or (block > DIGIT_NINE).any():
+		return None, position
+	if (block[separators[0::2]] != SPACE).any() or (block[separators[1::2]] != LINE_BREAK).any():
+		return None, position
+	if len(separators) < 2 * number_of_edges:
+		separators = np.append(separators, len(block))
+
+	starts = np.empty(len(separators), dtype=np.int64)
+	starts[0] = 0
+	starts[1:] = separators[:-1] + 1
+	lengths = separators - starts
+	if lengths.min() < 1 or lengths.max() > 10:
+		return None, position
+
+	# Read all numbers a digit at a time, in Horner's scheme
+	values = np.zeros(len(separators), dtype=np.int64)
+	last = len(block) - 1
+	for k in range(int(lengths.max())):
+		digits = block[np.minimum(starts + k, last)].astype(np.int64) - DIGIT_ZERO
+		values = np.where(k < lengths, 10 * values + digits, values)
+
+	return values.reshape(-1, 2), position + len(block)
 
-	number_of_graphs = len(graphs)
-	output_file.write(str(number_of_graphs) + '\n')
 
+# Binary cache files sit next to the text file they cache, named file_name + GRAPH_CACHE_SUFFIX:
+# - A header: magic, format version, the text file's mtime (ns), size and SHA-1, and
+#   the number of graphs.
+# - The byte offset of each graph record from the end of the offset table, plus the
+#   offset of the end of the last record.
+# - One record per graph: the width in bytes of its node IDs (1, 2 or 4), its number
+#   of edges M, and its 2M edge ends as little-endian unsigned integers of that width.
+# The text file stays canonical: a cache is only used while the text file's mtime,
+# size and SHA-1 all match its header.
+GRAPH_CACHE_MAGIC = b'MLSTG'
+GRAPH_CACHE_VERSION = 1
+GRAPH_CACHE_HEADER = struct.Struct('<5sBqq20sI')
+GRAPH_CACHE_RECORD_HEADER = struct.Struct('<BI')
+GRAPH_CACHE_TYPECODES = {1: 'u1', 2: 'u2', 4: 'u4'}
+
+
+# Returns the graphs from the binary cache of the given text file, relabeling each graph
+# if relabel, or None if it has no cache or the cache is out of date
+def load_graphs_from_cache(file_name, relabel=False):
+	cache_file_name = file_name + GRAPH_CACHE_SUFFIX
+	try:
+		with open(cache_file_name, 'rb') as cache_file:
+			data = cache_file.read()
+		status = os.stat(file_name)
+	except (IOError, OSError):
+		return None
+
+	if len(data) < GRAPH_CACHE_HEADER.size:
+		return None
+	magic, version, mtime, size, digest, number_of_graphs = GRAPH_CACHE_HEADER.unpack_from(data)
+	if magic != GRAPH_CACHE_MAGIC or version != GRAPH_CACHE_VERSION:
+		return None
+	if mtime != status.st_mtime_ns or size != status.st_size:
+		return None
+	if digest != hash_file(file_name):
+		return None
+
+	try:
+		return read_cached_graphs(data, number_of_graphs, relabel)
+	except (ValueError, KeyError, struct.error):
+		return None
+
+
+# Returns the graphs in the records of a cache file's contents (see
+# load_graphs_from_cache), built in bulk from their edge ends
+# Raises ValueError, KeyError or struct.error if the records are not laid out as the
+# offset table and record headers say.
+def read_cached_graphs(data, number_of_graphs, relabel=False):
+	records_start = GRAPH_CACHE_HEADER.size + 8 * (number_of_graphs + 1)
+	offsets = np.frombuffer(data, dtype='<u8', count=number_of_graphs + 1, offset=GRAPH_CACHE_HEADER.size)
+	if offsets[0] != 0 or (np.diff(offsets.astype(np.int64)) < GRAPH_CACHE_RECORD_HEADER.size).any() or records_start + int(offsets[-1]) != len(data):
+		raise ValueError('Graph cache records do not match their offsets.')
+
+	graphs = []
+	for i in range(number_of_graphs):
+		position = records_start + int(offsets[i])
+		width, number_of_edges = GRAPH_CACHE_RECORD_HEADER.unpack_from(data, position)
+		position += GRAPH_CACHE_RECORD_HEADER.size
+		if position + 2 * width * number_of_edges != records_start + int(offsets[i + 1]):
+			raise ValueError('Graph cache record ' + str(i) + ' has the wrong length.')
+
+		ends = np.frombuffer(data, dtype='<' + GRAPH_CACHE_TYPECODES[width], count=2 * number_of_edges, offset=position)
+		if (ends[0::2] == ends[1::2]).any():
+			raise ValueError('Graph cache record ' + str(i) + ' has a self-loop.')
+		graphs.append(make_graph_from_ends(ends, relabel))
+
+	return graphs
+
+
+# Writes the binary cache of the given text file, which holds the given graphs
+# Graphs are cached in their original node IDs, whether or not they were relabeled.
+# Failing to write a cache is not an error; the text file is simply parsed next time.
+def save_graphs_to_cache(file_name, graphs):
+	cache_file_name = file_name + GRAPH_CACHE_SUFFIX
+	temporary_file_name = cache_file_name + '.tmp'
+
+	records = []
+	offsets = array('Q', [0])
 	for graph in graphs:
-		output_graph_to_existing_file(graph, output_file)
+		ends = edge_end_array(graph)
+		largest_node = int(ends.max()) if len(ends) else 0
+		width = 1 if largest_node < 2 ** 8 else 2 if largest_node < 2 ** 16 else 4
+
+		records.append(GRAPH_CACHE_RECORD_HEADER.pack(width, graph.num_edges()))
+		records.append(ends.astype('<' + GRAPH_CACHE_TYPECODES[width]).tobytes())
+		offsets.append(offsets[-1] + GRAPH_CACHE_RECORD_HEADER.size + len(records[-1]))
+	if sys.byteorder != 'little':
+		offsets.byteswap()
+
+	try:
+		status = os.stat(file_name)
+		header = GRAPH_CACHE_HEADER.pack(GRAPH_CACHE_MAGIC, GRAPH_CACHE_VERSION, status.st_mtime_ns, status.st_size, hash_file(file_name), len(graphs))
+		with open(temporary_file_name, 'wb') as cache_file:
+			cache_file.write(header)
+			cache_file.write(offsets.tobytes())
+			for record in records:
+				cache_file.write(record)
+		os.replace(temporary_file_name, cache_file_name)
+	except (IOError, OSError):
+		pass
+
+
+# Returns the SHA-1 digest of the contents of a file
+def hash_file(file_name):
+	digest = hashlib.sha1()
+	with open(file_name, 'rb') as input_file:
+		for block in iter(lambda: input_file.read(1 << 20), b''):
+			digest.update(block)
+	return digest.digest()
+
+
+# Returns a copy of the graph with its nodes renumbered 0..n-1 in the order of their
+# original IDs, which are kept in its labels (see Graph); solvers work on the copy
+# as on any graph, and its trees are written out in the original IDs
+# A graph that is already relabeled is returned as it is.
+def relabel_graph(graph):
+	if graph.labels is not None:
+		return graph
+	return make_graph_from_ends(edge_end_array(graph), relabel=True)
+
+
+# Returns the graph with the given edge ends, an array of node IDs holding the ends of
+# each edge in turn, relabeled (see relabel_graph) if relabel
+# The graph is built in bulk from NumPy arrays of its edge keys and degrees (see
+# Graph.load_edges); edges must not be self-loops, and ValueError is raised if an edge
+# repeats.
+def make_graph_from_ends(ends, relabel=False):
+	ends = np.asarray(ends, dtype=np.int64).reshape(-1, 2)
+	labels = None
+	if relabel:
+		labels, ends = np.unique(ends, return_inverse=True)
+		ends = ends.reshape(-1, 2)
+
+	key_array = (np.minimum(ends[:, 0], ends[:, 1]) << EDGE_KEY_SHIFT) | np.maximum(ends[:, 0], ends[:, 1])
+	sorted_keys = np.sort(key_array)
+	if (sorted_keys[1:] == sorted_keys[:-1]).any():
+		raise ValueError('An edge repeats.')
+	keys = array('q')
+	keys.frombytes(key_array.astype(np.int64).tobytes())
+	degrees = array('i')
+	degrees.frombytes(np.bincount(ends.ravel()).astype(np.intc).tobytes())
 
-	output_file.close()
+	graph = Graph()
+	graph.load_edges(keys, degrees)
+	if relabel:
+		graph.labels = array('i', labels.tolist())
+	return graph
+
+
+# Returns the graph in its original node IDs
+def restore_labels(graph):
+	if graph.labels is None:
+		return graph
+	return make_graph_from_bytes(graph.to_bytes())
+
+
+# Returns the tree with its nodes numbered like those of the given graph, of which it
+# must be a subgraph: relabeled like the graph if the graph is relabeled, and in
+# original node IDs otherwise
+# Trees read from files or the solution store are in original IDs, so they go through
+# here before being compared with a relabeled graph.
+def relabel_like(tree, graph):
+	if tree.labels is graph.labels:
+		return tree
+	if graph.labels is None:
+		return restore_labels(tree)
+
+	ends = np.frombuffer(tree.to_bytes(), dtype='<i4')
+	relabeled_tree = Graph(len(graph.labels))
+	relabeled_tree.add_edges_uv(np.searchsorted(np.asarray(graph.labels), ends).reshape(-1, 2).tolist())
+	relabeled_tree.labels = graph.labels
+	return relabeled_tree
+
+
+# Raised when a text file of graphs cannot be read
+class GraphFileError(ValueError):
+	pass
+
+
+# Checks the given text file with the strict reader from reader.py, and raises a
+# GraphFileError naming the first line not in the format given by instructors
+# The reader checks node IDs and edge counts against the limits the fast path of
+# parse_graphs accepts, not those of config.py, so whether a file loads does not
+# depend on its line endings.
+def check_graphs_in_file(file_name):
+	try:
+		with reader_limits(MAX_NODE_ID + 1, sys.maxsize), open(file_name) as input_file:
+			reader.InFileReader(input_file).read_input_file()
+	except reader.ReaderException as exception:
+		raise GraphFileError('(' + file_name + ') ' + str(exception))
+
+
+# Sets the strict reader's limits on node IDs (config.MAX_NUM_NODES) and edges per
+# graph (config.MAX_NUM_EDGES) for the duration of a with statement
+@contextmanager
+def reader_limits(max_num_nodes, max_num_edges):
+	limits = config.MAX_NUM_NODES, config.MAX_NUM_EDGES
+	config.MAX_NUM_NODES, config.MAX_NUM_EDGES = max_num_nodes, max_num_edges
+	try:
+		yield
+	finally:
+		config.MAX_NUM_NODES, config.MAX_NUM_EDGES = limits
+
+
+# Yields the graphs in the given text file one at a time, holding only the current
+# line and graph in memory
+# Starts at the graph with index start_index. If byte_offset is also given, the file
+# is read from that offset, which must be where that graph starts (see
+# index_graphs_in_file); otherwise the graphs before it are skipped line by line.
+# Lines after the last graph are never read. Raises ValueError on a line that does not
+# start like the strict reader expects it to, and on a self-loop.
+# NOTE: Graphs must be in format given by instructors
+def iterate_graphs_from_file(file_name, start_index=0, byte_offset=None):
+	with open(file_name, 'rb') as input_file:
+
+		# Read the number of graphs in file
+		first_line = input_file.readline()
+		if len(first_line.strip()) == 0:
+			return
+		number_of_graphs = read_count(first_line)
+
+		# Move to the first graph wanted
+		if byte_offset is not None:
+			input_file.seek(byte_offset)
+		else:
+			for _ in range(start_index):
+				number_of_edges = read_count(input_file.readline())
+				for _ in range(number_of_edges):
+					input_file.readline()
+
+		# Read lines in nested structure
+		for _ in range(start_index, number_of_graphs):
+			number_of_edges = read_count(input_file.readline())
+			graph = Graph()
+
+			for _ in range(number_of_edges):
+				line = input_file.readline()
+				match = EDGE_LINE_REGEXP.match(line)
+				if match is None:
+					raise ValueError('Expected an edge, got ' + repr(line) + '.')
+				u, v = int(match.group(1)), int(match.group(2))
+				if u == v:
+					raise ValueError('Expected an edge, got the self-loop ' + repr(line) + '.')
+				graph.add_edge_uv(u, v)
+
+			yield graph
+
+
+# Lines as the strict reader reads them: a count or an edge at the start of the line
+COUNT_LINE_REGEXP = re.compile(reader.NUMBER_FORMAT_REGEXP[1].pattern.encode())
+EDGE_LINE_REGEXP = re.compile(reader.NUMBER_FORMAT_REGEXP[2].pattern.encode())
+
+
+# Returns the count at the start of a line, or raises ValueError if there is none
+def read_count(line):
+	match = COUNT_LINE_REGEXP.match(line)
+	if match is None:
+		raise ValueError('Expected a count, got ' + repr(line) + '.')
+	return int(match.group(1))
+
+
+# Returns the byte offset at which each graph in the given text file starts
+def index_graphs_in_file(file_name):
+	offsets = []
+
+	with open(file_name, 'rb') as input_file:
+		first_line = input_file.readline()
+		if len(first_line.strip()) == 0:
+			return offsets
+		number_of_graphs = read_count(first_line)
+
+		for _ in range(number_of_graphs):
+			offsets.append(input_file.tell())
+			number_of_edges = read_count(input_file.readline())
+			for _ in range(number_of_edges):
+				input_file.readline()
+
+	return offsets
+
+
+# Outputs several graphs to a text file in the format given by instructors
+# NOTE: Overwrites existing file with same name, atomically (see GraphFileWriter)
+def output_graphs_to_new_file(graphs, file_name):
+	with GraphFileWriter(file_name, len(graphs)) as writer:
+		for graph in graphs:
+			writer.write(graph)
 
 
 # Outputs the graph to a text file in the format given by instructors
 def output_graph_to_existing_file(graph, output_file):
+	output_file.write(format_graph(graph))
+
+
+# Returns the graph as text in the format given by instructors: its number of edges,
+# then one "u v" line per edge, in the order the edges were added and in the original
+# node IDs of a relabeled graph
+# All lines are formatted by a single %-format over the graph's edge ends, which are
+# unpacked from its edge keys with NumPy.
+def format_graph(graph):
+	number_of_edges = len(graph.edge_keys)
+	if number_of_edges == 0:
+		return '0\n'
 
-	# Build a list of distinct edges
-	edges = get_edges(graph)
+	ends = edge_end_array(graph)
+	return str(number_of_edges) + '\n' + ('%d %d\n' * number_of_edges) % tuple(ends.ravel().tolist())
 
-	# Output number of edges in this graph to file
-	number_of_edges = len(edges)
-	output_file.write(str(number_of_edges) + '\n')
 
-	# Output all the edges in this graph to file
-	for edge in edges:
-		u = edge.ends[0]
-		v = edge.ends[1]
-		output_file.write(str(u) + ' ' + str(v) + '\n')
+# Returns the graph's edges as an (M, 2) NumPy array of their ends, in the order the
+# edges were added and in original node IDs, unpacked from its edge keys
+def edge_end_array(graph):
+	keys = np.frombuffer(graph.edge_keys, dtype=np.int64)
+	ends = np.empty((len(keys), 2), dtype=np.int64)
+	ends[:, 0] = keys >> EDGE_KEY_SHIFT
+	ends[:, 1] = keys & EDGE_KEY_MASK
+	if graph.labels is not None:
+		ends = np.asarray(graph.labels)[ends]
+	return ends
+
+
+# Writes a given number of graphs to a text file in the format given by instructors,
+# one at a time (so trees can be written as they are solved)
+# Text goes through a large buffer to a temporary file, which replaces file_name only
+# when close() finds every graph written. Until then, and if writing fails, file_name
+# keeps its old contents, so a crash never leaves a truncated output file.
+class GraphFileWriter:
+
+	def __init__(self, file_name, number_of_graphs, buffer_size=OUTPUT_BUFFER_SIZE):
+		self.file_name = file_name
+		self.temporary_file_name = file_name + '.tmp'
+		self.number_of_graphs = number_of_graphs
+		self.number_written = 0
+		self.output_file = open(self.temporary_file_name, 'w', buffering=buffer_size)
+		self.output_file.write(str(number_of_graphs) + '\n')
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exception_type, exception_value, traceback):
+		if exception_type is None:
+			self.close()
+		else:
+			self.abort()
+
+	# Writes the next graph
+	def write(self, graph):
+		if self.number_written == self.number_of_graphs:
+			raise ValueError('All ' + str(self.number_of_graphs) + ' graphs of ' + self.file_name + ' were already written.')
+		self.output_file.write(format_graph(graph))
+		self.number_written += 1
+
+	# Flushes the temporary file to disk and moves it to file_name
+	def close(self):
+		if self.output_file.closed:
+			return
+		if self.number_written != self.number_of_graphs:
+			self.abort()
+			raise ValueError('Only ' + str(self.number_written) + ' of ' + str(self.number_of_graphs) + ' graphs of ' + self.file_name + ' were written.')
+
+		self.output_file.flush()
+		os.fsync(self.output_file.fileno())
+		self.output_file.close()
+		os.replace(self.temporary_file_name, self.file_name)
+
+	# Discards the temporary file, leaving file_name as it was
+	def abort(self):
+		if self.output_file.closed:
+			return
+		self.output_file.close()
+		os.remove(self.temporary_file_name)
 
 # Merges best solutions from two files into a single new file
 # NOTE: the tree at index i of File 1 must correspond to the tree at index i of File 2
@@ -84,11 +552,6 @@ def merge_solutions(file_name_1, file_name_2, merged_file_name):
 	trees_1 = input_graphs_from_file(file_name_1)
 	trees_2 = input_graphs_from_file(file_name_2)
 
-	for tree in trees_1:
-		tree.search()
-	for tree in trees_2:
-		tree.search()
-
 	best_trees = []
 	for i in range(len(trees_1)):
 		if trees_1[i].num_leaves >= trees_2[i].num_leaves:
@@ -0,0 +1,168 @@
+from graph import *
+from graph_helper import *
+from constants import *
+from disjointsets import *
+import cProfile
+import csv
+import graph_helper
+import json
+import sys
+import time
+import tracemalloc
+
+"""
+This file records where the solver's time goes, for deciding which algorithms are
+worth their CPU time on our instances.
+
+An Instrumentation collects one record per (instance, algorithm) run made through
+measure(), holding its wall time, peak memory, leaf count and budget iterations. While
+it is open (in a with block), it can also:
+- Time the helpers in HELPERS, adding each helper's calls and seconds to every record.
+  Helpers are wrapped wherever they are referenced, which slows hot ones like
+  DisjointSets.find down noticeably, so this is off by default.
+- Trace memory allocations with tracemalloc, for the peak memory of each run.
+- Profile the whole run with cProfile and save the stats to a file, for pstats.
+Records are written as JSON lines, or as CSV if the file name ends in .csv.
+"""
+
+# (owner, attribute name) of each helper whose time is recorded when time_helpers is set
+HELPERS = [
+	(graph_helper, 'get_edges'),
+	(Graph, 'search'),
+	(DisjointSets, 'find'),
+]
+
+# Columns of every record, before the helper columns (if helpers are timed)
+RECORD_FIELDS = ['instance', 'algorithm', 'seconds', 'peak_memory', 'leaves', 'nodes', 'iterations']
+
+
+class Instrumentation:
+
+	def __init__(self, trace_memory=True, time_helpers=False, profile_file_name=None):
+		self.trace_memory = trace_memory
+		self.time_helpers = time_helpers
+		self.profile_file_name = profile_file_name
+		self.records = []
+
+		# Helper name -> [calls, seconds] since the helpers were wrapped
+		self.helper_totals = dict((name, [0, 0.0]) for _, name in HELPERS)
+		self.wrapped_helpers = []
+		self.profiler = None
+		self.started_tracing = False
+
+	# Returns the settings of an Instrumentation that measures like this one, for
+	# worker processes (which keep their own records and do not profile)
+	def worker_settings(self):
+		return (self.trace_memory, self.time_helpers)
+
+	def __enter__(self):
+		self.open()
+		return self
+
+	def __exit__(self, *exception_info):
+		self.close()
+
+	# Starts memory tracing, helper timing and profiling, as configured
+	def open(self):
+		if self.trace_memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.started_tracing = True
+		if self.time_helpers:
+			self.wrap_helpers()
+		if self.profile_file_name is not None:
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+
+	# Stops whatever open() started, and saves the profile
+	def close(self):
+		if self.profiler is not None:
+			self.profiler.disable()
+			self.profiler.dump_stats(self.profile_file_name)
+			self.profiler = None
+		self.unwrap_helpers()
+		if self.started_tracing:
+			tracemalloc.stop()
+			self.started_tracing = False
+
+	# Returns function(*arguments) and records its run as `algorithm` on the instance
+	# The budget, if given, is the one the function ticks; its iterations are recorded.
+	def measure(self, instance, algorithm, graph, budget, function, *arguments):
+		helper_totals = self.copy_helper_totals()
+		if tracemalloc.is_tracing():
+			tracemalloc.reset_peak()
+			memory_before = tracemalloc.get_traced_memory()[0]
+
+		start_time = time.time()
+		tree = function(*arguments)
+		seconds = time.time() - start_time
+
+		peak_memory = None
+		if tracemalloc.is_tracing():
+			peak_memory = tracemalloc.get_traced_memory()[1] - memory_before
+
+		record = {
+			'instance': instance,
+			'algorithm': algorithm,
+			'seconds': seconds,
+			'peak_memory': peak_memory,
+			'leaves': len(get_leaves(tree)) if tree is not None else None,
+			'nodes': len(get_nodes(graph)),
+			'iterations': budget.iterations if budget is not None else None,
+		}
+		if self.time_helpers:
+			for name, (calls, helper_seconds) in self.helper_totals.items():
+				record[name + '_calls'] = calls - helper_totals[name][0]
+				record[name + '_seconds'] = helper_seconds - helper_totals[name][1]
+		self.records.append(record)
+
+		return tree
+
+	def copy_helper_totals(self):
+		return dict((name, list(totals)) for name, totals in self.helper_totals.items())
+
+	# Replaces every helper by a timed wrapper, in its owner and in every module that
+	# imported it by name
+	def wrap_helpers(self):
+		for owner, name in HELPERS:
+			helper = owner.__dict__[name]
+			wrapper = self.timed(name, helper)
+			holders = [owner] + [module for module in list(sys.modules.values())
+				if module is not owner and getattr(module, name, None) is helper]
+			for holder in holders:
+				setattr(holder, name, wrapper)
+			self.wrapped_helpers.append((name, helper, holders))
+
+	def unwrap_helpers(self):
+		for name, helper, holders in self.wrapped_helpers:
+			for holder in holders:
+				setattr(holder, name, helper)
+		self.wrapped_helpers = []
+
+	def timed(self, name, helper):
+		totals = self.helper_totals[name]
+
+		def timed_helper(*arguments):
+			start_time = time.perf_counter()
+			try:
+				return helper(*arguments)
+			finally:
+				totals[0] += 1
+				totals[1] += time.perf_counter() - start_time
+
+		return timed_helper
+
+	# Writes the records to a file: CSV if its name ends in .csv, JSON lines otherwise
+	def write(self, file_name):
+		fields = RECORD_FIELDS[:]
+		if self.time_helpers:
+			for _, name in HELPERS:
+				fields.extend([name + '_calls', name + '_seconds'])
+
+		with open(file_name, 'w', newline='') as output_file:
+			if file_name.endswith('.csv'):
+				writer = csv.DictWriter(output_file, fieldnames=fields)
+				writer.writeheader()
+				writer.writerows(self.records)
+			else:
+				for record in self.records:
+					output_file.write(json.dumps(record) + '\n')
@@ -0,0 +1,184 @@
+from array import array
+
+"""
+This file contains a link-cut tree (Sleator and Tarjan) over the dense integer nodes
+0..size-1, such as node IDs.
+
+It maintains a forest under link() and cut(), re-rooting trees as needed, and answers
+path queries in O(log n) amortized time per operation. Every node carries an integer
+value, and path_minimum() returns the smallest value on the path between two nodes
+together with a node holding it.
+
+Internally each preferred path is a splay tree ordered from the root end of the path
+to its other end. parent[] doubles as the path-parent pointer of a splay tree root;
+flip[] marks splay subtrees whose order must be reversed (pushed down lazily).
+"""
+
+class LinkCutTree:
+
+	def __init__(self, size):
+		self.left = array('i', [-1]) * size
+		self.right = array('i', [-1]) * size
+		self.parent = array('i', [-1]) * size
+		self.flip = bytearray(size)
+		self.value = array('i', [0]) * size
+		self.minimum = array('i', [0]) * size
+		self.argmin = array('i', range(size))
+
+	# Returns the value of a node
+	def get_value(self, node):
+		return self.value[node]
+
+	# Sets the value of a node
+	def set_value(self, node, value):
+		self._access(node)
+		self.value[node] = value
+		self._update(node)
+
+	# Adds the edge (u, v); u and v must be in different trees
+	def link(self, u, v):
+		self._make_root(u)
+		self.parent[u] = v
+
+	# Removes the edge (u, v), which must be in the forest
+	def cut(self, u, v):
+		self._make_root(u)
+		self._access(v)
+		# The path is now exactly u, v, with u alone in the left subtree of v
+		self.left[v] = -1
+		self.parent[u] = -1
+		self._update(v)
+
+	# Returns whether u and v are in the same tree
+	def connected(self, u, v):
+		return self._find_root(u) == self._find_root(v)
+
+	# Returns (smallest value, node with that value) over the path from u to v, which
+	# must be in the same tree
+	def path_minimum(self, u, v):
+		self._make_root(u)
+		self._access(v)
+		return self.minimum[v], self.argmin[v]
+
+	# Returns the neighbor of `node` on the path from `node` to `target`, which must be
+	# a different node in the same tree
+	def next_on_path(self, node, target):
+		self._make_root(target)
+		self._access(node)
+
+		# The predecessor of node in its splay tree is the previous node on the path
+		# from target
+		x = self.left[node]
+		self._push(x)
+		while self.right[x] != -1:
+			x = self.right[x]
+			self._push(x)
+		self._splay(x)
+		return x
+
+	def _is_splay_root(self, x):
+		p = self.parent[x]
+		return p == -1 or (self.left[p] != x and self.right[p] != x)
+
+	def _push(self, x):
+		if self.flip[x]:
+			left = self.left[x]
+			right = self.right[x]
+			self.left[x] = right
+			self.right[x] = left
+			if left != -1:
+				self.flip[left] ^= 1
+			if right != -1:
+				self.flip[right] ^= 1
+			self.flip[x] = 0
+
+	def _update(self, x):
+		minimum = self.value[x]
+		argmin = x
+		child = self.left[x]
+		if child != -1 and self.minimum[child] < minimum:
+			minimum = self.minimum[child]
+			argmin = self.argmin[child]
+		child = self.right[x]
+		if child != -1 and self.minimum[child] < minimum:
+			minimum = self.minimum[child]
+			argmin = self.argmin[child]
+		self.minimum[x] = minimum
+		self.argmin[x] = argmin
+
+	def _rotate(self, x):
+		left = self.left
+		right = self.right
+		parent = self.parent
+
+		p = parent[x]
+		g = parent[p]
+		if not self._is_splay_root(p):
+			if left[g] == p:
+				left[g] = x
+			else:
+				right[g] = x
+		parent[x] = g
+
+		if left[p] == x:
+			child = right[x]
+			left[p] = child
+			right[x] = p
+		else:
+			child = left[x]
+			right[p] = child
+			left[x] = p
+		if child != -1:
+			parent[child] = p
+		parent[p] = x
+
+		self._update(p)
+		self._update(x)
+
+	def _splay(self, x):
+		# Push pending flips down from the splay root to x
+		path = [x]
+		y = x
+		while not self._is_splay_root(y):
+			y = self.parent[y]
+			path.append(y)
+		for y in reversed(path):
+			self._push(y)
+
+		while not self._is_splay_root(x):
+			p = self.parent[x]
+			if not self._is_splay_root(p):
+				g = self.parent[p]
+				if (self.left[g] == p) == (self.left[p] == x):
+					self._rotate(p)
+				else:
+					self._rotate(x)
+			self._rotate(x)
+
+	# Makes the path from the root of x's tree to x preferred, with x at the root of
+	# its splay tree
+	def _access(self, x):
+		last = -1
+		y = x
+		while y != -1:
+			self._splay(y)
+			self.right[y] = last
+			self._update(y)
+			last = y
+			y = self.parent[y]
+		self._splay(x)
+
+	def _make_root(self, x):
+		self._access(x)
+		self.flip[x] ^= 1
+		self._push(x)
+
+	def _find_root(self, x):
+		self._access(x)
+		while True:
+			self._push(x)
+			if self.left[x] == -1:
+				break
+			x = self.left[x]
+		self._splay(x)
+		return x
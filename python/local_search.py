@@ -0,0 +1,115 @@
+from graph import *
+from graph_helper import *
+from constants import *
+from linkcut import *
+from array import array
+
+"""
+This file improves spanning trees by local search, as a post-processing stage for the
+output of any algorithm in solver_algorithms.py.
+
+A move adds an edge of the graph that is not in the tree and removes an edge on the
+cycle it closes. Only moves that increase the number of leaves are made:
+- Re-hanging: if a is a leaf whose tree neighbor p has degree 2, and b is internal,
+  replace (a, p) by (a, b). a stays a leaf and p becomes one.
+- Path swap: if a and b are both internal and some node w strictly between them on
+  the tree path has degree 2, replace the path edge from w towards a by (a, b).
+  w becomes a leaf (and so may its old neighbor), and no leaf is lost.
+Tree degrees are kept in an array and mirrored as node values in a link-cut tree, so
+"is there a degree-2 node on the path from a to b" is one O(log n) path-minimum query.
+"""
+
+# Returns a spanning tree of the graph with at least as many leaves as the given one,
+# made by applying leaf-increasing edge swaps until none is left (a local optimum) or
+# the budget (one iteration per swap) runs out
+def improve_tree(graph, tree, budget=None):
+	number_of_node_slots = max(graph.num_node_slots, tree.num_node_slots)
+	degree = array('i', [0]) * number_of_node_slots
+	tree_neighbors = [None] * number_of_node_slots
+	tree_edge_keys = set(tree.edge_keys)
+	paths = LinkCutTree(number_of_node_slots)
+
+	for node in get_nodes(tree):
+		degree[node] = tree.degree(node)
+		tree_neighbors[node] = set(tree.neighbors[node])
+		paths.set_value(node, degree[node])
+	for key in tree.edge_keys:
+		u, v = edge_ends(key)
+		paths.link(u, v)
+
+	# The largest value a node can hold; hides the ends of a path from its minimum
+	unreachable = number_of_node_slots + 1
+
+	def add_tree_edge(u, v):
+		tree_edge_keys.add(edge_key(u, v))
+		tree_neighbors[u].add(v)
+		tree_neighbors[v].add(u)
+		paths.link(u, v)
+		change_degree(u, 1)
+		change_degree(v, 1)
+
+	def remove_tree_edge(u, v):
+		tree_edge_keys.discard(edge_key(u, v))
+		tree_neighbors[u].discard(v)
+		tree_neighbors[v].discard(u)
+		paths.cut(u, v)
+		change_degree(u, -1)
+		change_degree(v, -1)
+
+	def change_degree(node, change):
+		degree[node] += change
+		paths.set_value(node, degree[node])
+
+	# Re-hangs leaf a from its tree neighbor onto b, if that gains a leaf
+	def try_rehanging(a, b):
+		p = next(iter(tree_neighbors[a]))
+		if degree[p] != 2 or degree[b] < 2:
+			return False
+		remove_tree_edge(a, p)
+		add_tree_edge(a, b)
+		return True
+
+	# Swaps (a, b) for a path edge next to a degree-2 node, if there is one
+	def try_path_swap(a, b):
+		paths.set_value(a, unreachable)
+		paths.set_value(b, unreachable)
+		minimum_degree, w = paths.path_minimum(a, b)
+		paths.set_value(a, degree[a])
+		paths.set_value(b, degree[b])
+		if minimum_degree != 2:
+			return False
+		remove_tree_edge(w, paths.next_on_path(w, a))
+		add_tree_edge(a, b)
+		return True
+
+	improved = True
+	while improved:
+		improved = False
+		for key in graph.edge_keys:
+			if key in tree_edge_keys:
+				continue
+			if budget is not None and budget.exhausted():
+				improved = False
+				break
+
+			a, b = edge_ends(key)
+			if degree[a] == 1 and degree[b] == 1:
+				continue
+			if degree[a] == 1:
+				swapped = try_rehanging(a, b)
+			elif degree[b] == 1:
+				swapped = try_rehanging(b, a)
+			else:
+				swapped = try_path_swap(a, b)
+
+			if swapped:
+				improved = True
+				if budget is not None:
+					budget.tick()
+
+	improved_tree = Graph()
+	for key in tree_edge_keys:
+		improved_tree.add_edge_key(key)
+	improved_tree.labels = graph.labels
+
+	return improved_tree
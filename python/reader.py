@@ -1,4 +1,5 @@
 import config
+import disjointsets
 import graph
 
 import re
@@ -26,6 +27,25 @@ class ReaderException(BaseException):
             return ""
         return ' (Graph #{0})'.format(self.case_num)
 
+def count_nodes_and_components(edge_set):
+    """
+    Number of non-isolated nodes of the graph with the given edges (as
+    packed keys, see graph.edge_key), and number of connected components
+    among them, from one union-find pass. Nodes are numbered densely in the
+    order they are met, so this takes O(E) time and space whatever their IDs.
+    """
+    index = {}
+    ends = []
+    for key in edge_set:
+        u = index.setdefault(key >> graph.EDGE_KEY_SHIFT, len(index))
+        v = index.setdefault(key & graph.EDGE_KEY_MASK, len(index))
+        ends.append((u, v))
+
+    components = disjointsets.DisjointSets(len(index))
+    for u, v in ends:
+        components.union(u, v)
+    return len(index), components.num_components
+
 class Reader:
     def __init__(self, file_obj):
         self.file_obj = file_obj
@@ -75,30 +95,46 @@ class InFileReader(Reader):
         nums = self.read_numbers('Cannot parse the number of input graphs.', 1)
 
         num_cases = nums[0]
+        # Number of non-isolated nodes of each graph, for OutFileReader
+        self.node_counts = []
+        edge_sets = self.read_input_graphs(0, num_cases)
+
+        self.case_num += 1
+        self.readline()
+        if len(self.line) > 0:
+            raise self.exception_with_expected('Extra lines after Graph ' +
+                    '#{0} (line 1 says the number of graphs is {0}).'.
+                    format(num_cases), 'Expecting EOF.')
+
+        return edge_sets
+
+    def read_input_graphs(self, first_case, num_cases):
+        """
+        Reads and checks the num_cases graphs after Graph #first_case, and
+        returns their edge sets. Their node counts go to self.node_counts.
+        """
         edge_sets = []
-        for i in range(num_cases):
+        for i in range(first_case, first_case + num_cases):
             self.case_num = i+1
             es = self.read_input_graph()
 
-            G = graph.make_graph(es)
-            G.search()
-            if not G.edges_in_one_component():
+            num_nodes, num_components = count_nodes_and_components(es)
+            if num_components != 1:
                 raise self.exception('Disconnected graph: after reading '+
                 'the last edge of this graph, the edges are not in '+
                 'the same component.')
 
             edge_sets.append(es)
-
-        self.case_num += 1
-        self.readline()
-        if len(self.line) > 0:
-            raise self.exception_with_expected('Extra lines after Graph ' +
-                    '#{0} (line 1 says the number of graphs is {0}).'.
-                    format(num_cases), 'Expecting EOF.')
+            self.node_counts.append(num_nodes)
 
         return edge_sets
 
     def read_input_graph(self):
+        """
+        Reads and checks one input graph, and returns its edges as a set of
+        packed keys (see graph.edge_key). Edge objects are only made to
+        report errors.
+        """
         nums = self.read_numbers('Cannot parse the number of edges.', 1)
 
         num_edges = nums[0]
@@ -106,26 +142,34 @@ class InFileReader(Reader):
             raise self.exception('Number of edges cannot '+
                     'exceed {0}.'.format(config.MAX_NUM_EDGES))
 
+        max_num_nodes = config.MAX_NUM_NODES
         edge_set = set()
         for i in range(num_edges):
-            nums = self.read_numbers('Cannot parse the next edge.', 2)
-            e = graph.Edge(nums[0], nums[1])
+            u, v = self.read_numbers('Cannot parse the next edge.', 2)
 
-            try:
-                e.check()
-            except graph.EdgeException as ex:
-                raise self.exception(str(ex))
+            if u == v or u >= max_num_nodes or v >= max_num_nodes:
+                try:
+                    graph.Edge(u, v).check()
+                except graph.EdgeException as ex:
+                    raise self.exception(str(ex))
 
-            if e in edge_set:
+            key = graph.edge_key(u, v)
+            if key in edge_set:
                 raise self.exception(('Edge {0} (or its reverse) '+
-                'is duplicated.').format(e))
+                'is duplicated.').format(graph.Edge(u, v)))
 
-            edge_set.add(e)
+            edge_set.add(key)
 
         return edge_set
 
 class OutFileReader(Reader):
-    def read_output_file(self, edge_sets):
+    def read_output_file(self, edge_sets, node_counts=None):
+        """
+        Checks that each output graph is a spanning tree of the input graph
+        with the same index and returns their numbers of leaves. node_counts
+        are the input graphs' numbers of non-isolated nodes, as cached by
+        InFileReader; they are recomputed if not given.
+        """
         nums = self.read_numbers('Cannot parse the number of output graphs.', 1)
 
         if nums[0] != len(edge_sets):
@@ -134,11 +178,7 @@ class OutFileReader(Reader):
                         nums[0], len(edge_sets)))
 
         num_cases = len(edge_sets)
-        num_leaves = []
-
-        for i in range(num_cases):
-            self.case_num = i+1
-            num_leaves.append(self.read_output_graph(edge_sets[i]))
+        num_leaves = self.read_output_graphs(0, edge_sets, node_counts)
 
         self.case_num += 1
         self.readline()
@@ -149,43 +189,68 @@ class OutFileReader(Reader):
 
         return num_leaves
 
-    def read_output_graph(self, in_edge_set):
+    def read_output_graphs(self, first_case, edge_sets, node_counts=None):
+        """
+        Reads and checks the output graphs after Graph #first_case against
+        the given input graphs, and returns their numbers of leaves.
+        """
+        num_leaves = []
+        for i in range(len(edge_sets)):
+            self.case_num = first_case + i+1
+            num_nodes = None if node_counts is None else node_counts[i]
+            num_leaves.append(self.read_output_graph(edge_sets[i], num_nodes))
+        return num_leaves
+
+    def read_output_graph(self, in_edge_set, num_nodes=None):
         nums = self.read_numbers('Cannot parse the number of edges.', 1)
 
-        Gin = graph.make_graph(in_edge_set)
-        Gin.search()
-        if nums[0] != Gin.num_nodes-1:
+        if num_nodes is None:
+            num_nodes = count_nodes_and_components(in_edge_set)[0]
+        if nums[0] != num_nodes-1:
             raise self.exception(('Input graph has {0} non-isolated '+
                     'nodes, output graph should have {1} edges, '+
-                    'got {2} instead.').format(Gin.num_nodes, Gin.num_nodes-1,
+                    'got {2} instead.').format(num_nodes, num_nodes-1,
                         nums[0]))
 
+        # Edges are merged into components as they are read, so a cycle is
+        # reported on the line of the edge that closes it. Output nodes are
+        # input nodes, so they are numbered densely below num_nodes.
+        components = disjointsets.DisjointSets(num_nodes)
+        degrees = [0] * num_nodes
+        index = {}
+
         out_edge_set = set()
         num_edges = nums[0]
         for i in range(num_edges):
             nums = self.read_numbers('Cannot parse the next edge.', 2)
-            e = graph.Edge(nums[0], nums[1])
+            key = graph.edge_key(nums[0], nums[1])
 
-            if e not in in_edge_set:
+            if key not in in_edge_set:
                 raise self.exception(('Edge {0} in the output graph is '+
-                'absent in the input graph.').format(e))
+                'absent in the input graph.').format(graph.Edge(*nums)))
 
-            if e in out_edge_set:
+            if key in out_edge_set:
                 raise self.exception(('Edge {0} (or its reverse) is '+
-                'duplicated.').format(e))
+                'duplicated.').format(graph.Edge(*nums)))
+
+            u = index.setdefault(nums[0], len(index))
+            v = index.setdefault(nums[1], len(index))
+            if not components.union(u, v):
+                raise self.exception(('Cycle detected: edge {0} closes a '+
+                'cycle, the output graph should not have cycles to be a '+
+                'spanning tree.').format(graph.Edge(*nums)))
 
-            out_edge_set.add(e)
+            out_edge_set.add(key)
+            degrees[u] += 1
+            degrees[v] += 1
 
-        Gout = graph.make_graph(out_edge_set)
-        Gout.search()
-        if Gout.num_nodes != Gin.num_nodes:
+        out_num_nodes = len(index)
+        if out_num_nodes != num_nodes:
             raise self.exception(('After reading the last edge, the number '+
                     'of non-isolated nodes in the output graph ({0}) '+
                     'should equal that of the input graph ({1}) to be '+
-                    'a spanning tree.').format(Gout.num_nodes, Gin.num_nodes))
-        if not Gout.edges_in_one_component:
-            raise self.exception('Disconnected graph: after reading the last edge, the output graph should be connected to be a spanning tree.')
-        if Gout.has_cycle:
-            raise self.exception('Cycle detected: after reading the last edge, the output graph should not have cycles to be a spanning tree.')
+                    'a spanning tree.').format(out_num_nodes, num_nodes))
 
-        return Gout.num_leaves
+        # num_nodes-1 edges without a cycle that touch all num_nodes nodes
+        # form a single tree, so the output graph is connected
+        return degrees.count(1)
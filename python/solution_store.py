@@ -0,0 +1,98 @@
+from graph import *
+from graph_helper import *
+from constants import *
+from input_output import *
+import sqlite3
+import time
+
+"""
+This file contains a persistent store of the best spanning tree found so far for
+each graph, keyed by graph fingerprint (see Graph.fingerprint).
+
+Each record holds the tree, its leaf count, the algorithm that produced it and the
+time it took. Records are only ever replaced by strictly leafier trees, each update
+in its own transaction, so an interrupted run never loses earlier solutions.
+"""
+
+class SolutionStore:
+
+	def __init__(self, file_name=SOLUTION_STORE):
+		self.connection = sqlite3.connect(file_name)
+		with self.connection:
+			self.connection.execute(
+				'CREATE TABLE IF NOT EXISTS solutions ('
+				'fingerprint TEXT PRIMARY KEY, '
+				'leaves INTEGER NOT NULL, '
+				'algorithm TEXT NOT NULL, '
+				'seconds REAL NOT NULL, '
+				'edges BLOB NOT NULL, '
+				'updated REAL NOT NULL)')
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception_info):
+		self.close()
+
+	def __len__(self):
+		return self.connection.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+	def close(self):
+		self.connection.close()
+
+	# Returns the leaf count of the best known tree for the graph, or None
+	def best_leaf_count(self, graph):
+		row = self.connection.execute('SELECT leaves FROM solutions WHERE fingerprint = ?',
+			(get_fingerprint(graph),)).fetchone()
+		return row[0] if row else None
+
+	# Returns (tree, leaf count, algorithm, seconds) for the best known tree for the
+	# graph, or None if the graph has no record
+	def best_solution(self, graph):
+		row = self.connection.execute('SELECT edges, leaves, algorithm, seconds FROM solutions WHERE fingerprint = ?',
+			(get_fingerprint(graph),)).fetchone()
+		if row is None:
+			return None
+		return (make_graph_from_bytes(row[0]), row[1], row[2], row[3])
+
+	# Returns the best known tree for the graph, or None
+	def best_tree(self, graph):
+		solution = self.best_solution(graph)
+		return solution[0] if solution else None
+
+	# Records the tree as a solution for the graph if it has more leaves than the
+	# stored one. Returns whether the store was updated.
+	def record(self, graph, tree, algorithm, seconds=0.0):
+		leaves = len(get_leaves(tree))
+		with self.connection:
+			cursor = self.connection.execute(
+				'INSERT INTO solutions (fingerprint, leaves, algorithm, seconds, edges, updated) '
+				'VALUES (?, ?, ?, ?, ?, ?) '
+				'ON CONFLICT (fingerprint) DO UPDATE SET '
+				'leaves = excluded.leaves, algorithm = excluded.algorithm, seconds = excluded.seconds, '
+				'edges = excluded.edges, updated = excluded.updated '
+				'WHERE excluded.leaves > solutions.leaves',
+				(get_fingerprint(graph), leaves, algorithm, seconds, tree.to_bytes(), time.time()))
+		return cursor.rowcount > 0
+
+	# Records each tree as a solution for the graph at the same index
+	# Returns the number of graphs whose record improved
+	def import_solutions(self, graphs, trees, algorithm):
+		improved = 0
+		for graph, tree in zip(graphs, trees):
+			if self.record(graph, tree, algorithm):
+				improved += 1
+		return improved
+
+	# Writes the best known tree for each graph to a file in the format given by
+	# instructors, streaming each tree out as it is read from the store. Graphs without
+	# a record get the corresponding tree from fallback_trees, if given.
+	def export(self, graphs, file_name, fallback_trees=None):
+		with GraphFileWriter(file_name, len(graphs)) as writer:
+			for i in range(len(graphs)):
+				tree = self.best_tree(graphs[i])
+				if tree is None:
+					if fallback_trees is None:
+						raise KeyError('No solution stored for graph ' + str(i) + '.')
+					tree = fallback_trees[i]
+				writer.write(tree)
@@ -1,8 +1,11 @@
-import util
 from graph import *
 from graph_helper import *
 from constants import *
 from disjointsets import *
+from array import array
+from heapq import heapify, heappop, heappush
+import numpy as np
+import time
 
 """
 This file contains all the algorithms we have written to extract a leafy spanning tree
@@ -10,160 +13,521 @@ from a graph.
 
 Every algorithm should be written in its own function, conforming to the following signature:
 
-	def my_algorithm(graph):
+	def my_algorithm(graph, budget=None):
 		# Clever algorithm goes here
 		return tree
 
+An algorithm that does not apply to a graph may return None instead of a tree.
+Algorithms that iterate should call budget.tick() (when a budget is given) once per
+iteration and return their best tree so far as soon as it returns False.
+
 IMPORTANT: At the bottom of this file, make sure that all algorithm functions are stored
 in the ALGORITHMS list. This allows them to be called from graph_solver.py.
 """
 
-def randomized_tree(graph):
-	
-	# Fill out graph attributes
-	graph.search()
-	nodes = get_nodes(graph)
-	edges = get_edges(graph)
+# Limits how long an algorithm may run, by wall-clock time and/or number of iterations
+# The time limit is the earlier of `seconds` from now and the absolute `deadline`
+class Budget:
+
+	def __init__(self, seconds=None, iterations=None, deadline=None):
+		self.deadline = deadline
+		if seconds is not None:
+			self.deadline = time.time() + seconds
+			if deadline is not None:
+				self.deadline = min(self.deadline, deadline)
+		self.max_iterations = iterations
+		self.iterations = 0
+
+	# Returns whether the budget has run out
+	def exhausted(self):
+		if self.max_iterations is not None and self.iterations >= self.max_iterations:
+			return True
+		return self.deadline is not None and time.time() >= self.deadline
+
+	# Counts iterations and returns whether another one fits in the budget
+	def tick(self, count=1):
+		self.iterations += count
+		return not self.exhausted()
+
+
+# Runs randomized Kruskal's algorithm NUMBER_OF_RANDOM_RUNS times and returns the
+# leafiest tree. Runs are done in batches by random_kruskal_batch, of at most
+# RANDOM_RUN_BATCH_SIZE runs and RANDOM_RUN_BATCH_ENTRIES (runs * E) matrix entries, or
+# one at a time by random_kruskal on graphs too large for RANDOM_RUN_MINIMUM_BATCH_SIZE
+# runs per batch. The first run is always done alone, as it quickly gives a tree.
+# The budget is ticked once per run after each batch, and checked during a batch,
+# which is abandoned if the budget runs out. Returns None if no run was completed.
+def randomized_tree(graph, budget=None):
+
+	# Relabel nodes densely as 0..n-1 and read the edges as an (E, 2) array
+	nodes = np.array(sorted(get_nodes(graph)), dtype=np.int32)
+	if len(nodes) < 2:
+		return None
+	keys = np.frombuffer(graph.edge_keys, dtype=np.int64)
+	end_pairs = np.stack((keys >> EDGE_KEY_SHIFT, keys & EDGE_KEY_MASK), axis=1)
+	end_pairs = np.searchsorted(nodes, end_pairs).astype(np.int32)
+	batch_size = min(RANDOM_RUN_BATCH_SIZE, RANDOM_RUN_BATCH_ENTRIES // len(end_pairs))
+	if batch_size < RANDOM_RUN_MINIMUM_BATCH_SIZE:
+		batch_size = 1
+
+	generator = np.random.default_rng()
+	sets = DisjointSets(len(nodes))
 
 	# Bests so far
 	most_leaves = 0
-	best_tree = None
-
-	# Run N iterations of randomized algorithm, save the best 
-	for i in range(0, NUMBER_OF_RANDOM_RUNS):
-
-		# Add all vertices of graph to disjoint set
-		disjoint_set = UnionFind()
-		disjoint_set.insert_objects(nodes)
-
-		# Shuffle edges to make function stochastic
-		shuffle(edges)
-
-		num_edges = 0
-		current_tree = Graph(MAXIMUM_NUMBER_OF_NODES)
+	best_edges = None
+
+	# Run batches of the randomized algorithm, save the best
+	runs_left = NUMBER_OF_RANDOM_RUNS
+	while runs_left > 0:
+		runs = min(runs_left, batch_size if best_edges is not None else 1)
+		if budget is not None and budget.max_iterations is not None:
+			runs = max(1, min(runs, budget.max_iterations - budget.iterations))
+
+		if runs == 1:
+			batch = random_kruskal(end_pairs, sets, generator, budget)
+		else:
+			batch = random_kruskal_batch(end_pairs, len(nodes), runs, generator, budget)
+		if batch is None:
+			break
+		runs_left -= runs
+		leaf_counts, tree_edges = batch
+		best_run = int(np.argmax(leaf_counts))
+		if leaf_counts[best_run] > most_leaves:
+			most_leaves = leaf_counts[best_run]
+			best_edges = tree_edges[best_run]
+
+		if budget is not None and not budget.tick(runs):
+			break
+
+	if best_edges is None:
+		return None
+
+	# Build a graph only for the winning run
+	best_tree = Graph()
+	for u, v in nodes[end_pairs[best_edges]].tolist():
+		best_tree.add_edge_uv(u, v)
 
-		# Build graph
-		for edge in edges:
-			u, v = edge.ends
-
-			# Add edge if it doesn't create a cycle
-			if disjoint_set.find(u) != disjoint_set.find(v):
-				disjoint_set.union(u, v)
-				current_tree.add_edge(edge)
-				num_edges += 1
+	return best_tree
 
-			# Check leaves when tree is complete, |E| = |V| - 1
-			if num_edges == len(nodes) - 1:
-				num_leaves = len(get_leaves(current_tree))
-				
-				# Update best_tree if better num_leaves
-				if num_leaves > most_leaves:
-					most_leaves = num_leaves
-					best_tree = current_tree
 
+# Runs randomized Kruskal's algorithm once, as random_kruskal_batch does for a batch
+# of one run, with its union-find in the given DisjointSets over the graph's nodes,
+# which is reset and reused from one run to the next
+def random_kruskal(end_pairs, sets, generator, budget=None):
+	pairs = end_pairs.tolist()
+	number_of_nodes = len(sets)
+	sets.reset()
+	tree_edges = []
+
+	for k, edge in enumerate(generator.permutation(len(pairs)).tolist()):
+		if budget is not None and k % RANDOM_RUN_BUDGET_CHECK == 0 and budget.exhausted():
+			return None
+		u, v = pairs[edge]
+		if sets.union(u, v):
+			tree_edges.append(edge)
+			if len(tree_edges) == number_of_nodes - 1:
 				break
 
-	return best_tree
+	degrees = np.bincount(end_pairs[tree_edges].ravel(), minlength=number_of_nodes)
+	return np.array([(degrees == 1).sum()]), np.array([tree_edges], dtype=np.int32)
+
+
+# Runs randomized Kruskal's algorithm `runs` times at once on a connected graph with
+# nodes 0..number_of_nodes-1 and the given (E, 2) array of edge ends.
+# Every run gets its own random edge order (a row of a (runs, E) permutation
+# matrix) and its own row of a (runs, n) union-find parent array; the k-th edge of
+# every run is processed in the same vectorized step.
+# Returns the leaf count of each run's tree and a (runs, n-1) array of the indices
+# of the edges in each run's tree, or None if the budget (if any) runs out first; it
+# is checked every RANDOM_RUN_BUDGET_CHECK edges.
+def random_kruskal_batch(end_pairs, number_of_nodes, runs, generator, budget=None):
+	number_of_edges = len(end_pairs)
+	rows = np.arange(runs)
+
+	orders = np.argsort(generator.random((runs, number_of_edges)), axis=1).astype(np.int32)
+	tree_edges = np.empty((runs, number_of_nodes - 1), dtype=np.int32)
+	tree_sizes = np.zeros(runs, dtype=np.int32)
+
+	# The parent rows are stored flat; node u of run r is at r * n + u
+	row_offsets = (rows * number_of_nodes).astype(np.int32)
+	parent = np.arange(runs * number_of_nodes, dtype=np.int32)
+	ends = (row_offsets[:, None, None] + end_pairs[None, :, :]).reshape(runs, -1)
+
+	# Finds the root of one node per run, halving paths as it goes
+	def find(nodes):
+		parents = parent[nodes]
+		while (parents != nodes).any():
+			grandparents = parent[parents]
+			parent[nodes] = grandparents
+			nodes = grandparents
+			parents = parent[nodes]
+		return nodes
+
+	for k in range(number_of_edges):
+		if budget is not None and k % RANDOM_RUN_BUDGET_CHECK == 0 and budget.exhausted():
+			return None
+		edges = orders[:, k]
+		u_roots = find(ends[rows, 2 * edges])
+		v_roots = find(ends[rows, 2 * edges + 1])
+
+		# Add edge if it doesn't create a cycle
+		joins = u_roots != v_roots
+		if not joins.any():
+			continue
+		parent[u_roots[joins]] = v_roots[joins]
+		tree_edges[rows[joins], tree_sizes[joins]] = edges[joins]
+		tree_sizes += joins
+
+		# Stop when every tree is complete, |E| = |V| - 1
+		if tree_sizes.min() == number_of_nodes - 1:
+			break
+
+	# Count leaves from the degree array of each run's tree
+	tree_ends = np.take_along_axis(ends, np.concatenate((2 * tree_edges, 2 * tree_edges + 1), axis=1), axis=1)
+	degrees = np.bincount(tree_ends.ravel(), minlength=runs * number_of_nodes).reshape(runs, number_of_nodes)
+	leaf_counts = (degrees == 1).sum(axis=1)
+
+	return leaf_counts, tree_edges
 
 
 # Implements the Lu-Ravi algorithm in the paper "Approximating Maximum Leaf
 # Spanning Trees in Almost Linear Time"
-def joined_forest_tree(graph):
-
+# The budget is ticked once per node visited while building the forest; when it runs
+# out, the forest built so far is joined into a spanning tree.
+def joined_forest_tree(graph, budget=None):
+
+	# Builds a maximally leafy forest: each node v is joined to every neighboring tree
+	# (one edge per tree) if that would give v degree at least 3 in the forest.
+	# Neighboring trees are collected by their union-find roots in a dictionary and
+	# forest degrees are read from the forest's degree array, so this takes
+	# O(E * inverse_ackermann(V)) time and never copies the graph.
 	def maximally_leafy_forest(graph):
-		# Initialization
-		G = create_copy(graph)
-		E = get_edges(G)
-		V = get_nodes(G)
-		S = UnionFind()
-		d = {}
-		F = set()
-
-		for v in V:
-			S.find(v)
-			d[v] = 0
-
-		for v in V:
-			S_prime = {}	# Maps vertex to union-find set index
-			d_prime = 0
-			for u in G.neighbors[v]:
-				if S.find(u) != S.find(v) and S.find(u) not in S_prime.values():
-					d_prime += 1
-					S_prime[u] = S.find(u)
-			if d[v] + d_prime >= 3:
-				for u in S_prime:
-					F.add(Edge(u,v))
-					S.union(u, v)
-					d[u] += 1
-					d[v] += 1
-
-		return make_graph(F)
-
-	# Takes a leafy forest (a Graph instance composed of one or more disjoint trees) and
-	# a list of unused edges in the original graph.
-	# Returns a leafy spanning tree of the original graph.
-	def create_spanning_tree_from_forest(forest, unused_edges):
-
-		def is_leaf(node):
-			return len(forest.neighbors[node]) == 1
-
-		spanning_tree = create_copy(forest)
-
-		nodes = get_nodes(forest)
-		edges = get_edges(forest)
-
-		# Initialize meta-graph
-		connected_components = UnionFind()
-		connected_components.insert_objects(nodes)
-		for edge in edges:
-			connected_components.union(edge.ends[0], edge.ends[1])
-
-		# Sort unused edges by tier as follows:
-		# 1. Edge from internal node to internal node
-		# 2. Edge from internal node to leaf
-		# 3. Edge from leaf to leaf
-		internal_to_internal_edges = []
-		internal_to_leaf_edges = []
-		leaf_to_leaf_edges = []
-		for edge in unused_edges:
-			u, v = edge.ends
-			if not is_leaf(u) and not is_leaf(v):
-				internal_to_internal_edges.append(edge)
-			elif is_leaf(u) and is_leaf(v):
-				leaf_to_leaf_edges.append(edge)
-			else:
-				internal_to_leaf_edges.append(edge)
-		unused_edges = internal_to_internal_edges
-		unused_edges.extend(internal_to_leaf_edges)
-		unused_edges.extend(leaf_to_leaf_edges)
+		S = DisjointSets(graph.num_node_slots)
+		F = Graph()
 
-		# Add edges (by tier) if it doesn't induce a cycle
-		for edge in unused_edges:
-			u, v = edge.ends
-			if connected_components.find(u) != connected_components.find(v):
-				spanning_tree.add_edge(edge)
-				connected_components.union(u, v)
+		for visited, v in enumerate(get_nodes(graph), 1):
+			if budget is not None and visited % 256 == 0 and not budget.tick(256):
+				break
+			v_root = S.find(v)
+			S_prime = {}	# Maps union-find root of each neighboring tree to a neighbor in it
+			for u in graph.neighbors[v]:
+				u_root = S.find(u)
+				if u_root != v_root and u_root not in S_prime:
+					S_prime[u_root] = u
+			if F.degree(v) + len(S_prime) >= 3:
+				for u in S_prime.values():
+					F.add_edge_uv(u, v)
+					S.union(u, v)
 
-		return spanning_tree
+		return F
 
 	leafy_forest = maximally_leafy_forest(graph)
-
-	unused_edges = get_edge_difference(graph, leafy_forest)
-	leafy_spanning_tree = create_spanning_tree_from_forest(leafy_forest, unused_edges)
+	leafy_spanning_tree = create_spanning_tree_from_forest(graph, leafy_forest)
 
 	return leafy_spanning_tree
 
 
-# YOUR CLEVER ALGORITHMS HERE
-
-
+# Takes a graph and a leafy forest of it (a Graph instance composed of one or more
+# disjoint trees). Returns a leafy spanning tree of the graph that contains the forest.
+def create_spanning_tree_from_forest(graph, forest):
+	edge_keys = graph.edge_keys
+	spanning_tree = create_copy(forest)
+
+	# Initialize meta-graph
+	connected_components = DisjointSets(graph.num_node_slots)
+	for key in forest.edge_keys:
+		u, v = edge_ends(key)
+		connected_components.union(u, v)
+
+	# Tag each edge of the graph with its tier, in one pass:
+	# 0. Edge from internal node to internal node
+	# 1. Edge from internal node to leaf
+	# 2. Edge from leaf to leaf
+	# 3. Edge already in the forest
+	# and count the edges in each tier
+	tiers = bytearray(len(edge_keys))
+	tier_sizes = [0, 0, 0, 0]
+	for i in range(len(edge_keys)):
+		key = edge_keys[i]
+		if forest.has_edge_key(key):
+			tier = 3
+		else:
+			u, v = edge_ends(key)
+			tier = (forest.degree(u) == 1) + (forest.degree(v) == 1)
+		tiers[i] = tier
+		tier_sizes[tier] += 1
+
+	# Counting sort of the unused edges by tier
+	tier_starts = [0, tier_sizes[0], tier_sizes[0] + tier_sizes[1], tier_sizes[0] + tier_sizes[1] + tier_sizes[2]]
+	unused_edges = array('i', [0]) * tier_starts[3]
+	for i in range(len(edge_keys)):
+		tier = tiers[i]
+		if tier < 3:
+			unused_edges[tier_starts[tier]] = i
+			tier_starts[tier] += 1
+
+	# Add edges (by tier) if it doesn't induce a cycle, until the tree spans the graph
+	edges_to_add = len(get_nodes(graph)) - 1 - forest.num_edges()
+	for i in unused_edges:
+		if edges_to_add == 0:
+			break
+		u, v = edge_ends(edge_keys[i])
+		if connected_components.union(u, v):
+			spanning_tree.add_edge_uv(u, v)
+			edges_to_add -= 1
+
+	return spanning_tree
+
+
+# Implements the expansion rules of Solis-Oba's algorithm in the paper "2-Approximation
+# Algorithm for Finding a Spanning Tree with Maximum Number of Leaves", then joins the
+# resulting forest into a spanning tree like joined_forest_tree does
+#
+# Trees of the forest grow by expanding leaves: expanding a node adds all its
+# neighbors outside the forest as its children. A leaf x is expanded by rule
+# 1. if x has at least 2 neighbors outside the forest, or else by rule
+# 2. if x has exactly 1 neighbor y outside the forest and y has at least 2 neighbors
+#    outside the forest, in which case y is expanded right after x.
+# Rule 1 takes priority over rule 2, and within a rule the expansion adding the most
+# leaves goes first. When no leaf can be expanded, a new tree is started at the node
+# with the most neighbors outside the forest, as long as it has at least 3.
+#
+# Leaves wait in a priority queue keyed by (rule, -leaves gained). Counts of
+# neighbors outside the forest only decrease, so keys only get worse; a stale
+# entry is re-pushed with its current key when popped. Adding a node to the forest
+# costs O(deg) counter updates, and the graph is never rescanned.
+# The budget is ticked once per expansion; when it runs out, the forest grown so far
+# is joined into a spanning tree.
+def expanded_forest_tree(graph, budget=None):
+	number_of_node_slots = graph.num_node_slots
+	forest = Graph()
+	in_forest = bytearray(number_of_node_slots)
+	outside_degree = array('i', graph.degrees)
+	frontier = []
+
+	def add_to_forest(node):
+		in_forest[node] = 1
+		for neighbor in graph.neighbors[node]:
+			outside_degree[neighbor] -= 1
+
+	# Returns the neighbor of a node that is outside the forest
+	def outside_neighbor(node):
+		for neighbor in graph.neighbors[node]:
+			if not in_forest[neighbor]:
+				return neighbor
+
+	# Returns the (rule, -leaves gained) key of expanding a leaf, or None if no rule applies
+	def expansion_key(leaf):
+		if outside_degree[leaf] >= 2:
+			return (1, 1 - outside_degree[leaf])
+		if outside_degree[leaf] == 1:
+			y = outside_neighbor(leaf)
+			if outside_degree[y] >= 2:
+				return (2, 1 - outside_degree[y])
+		return None
+
+	expansions = [0]
+
+	def expand(node):
+		expansions[0] += 1
+		children = [neighbor for neighbor in graph.neighbors[node] if not in_forest[neighbor]]
+		for child in children:
+			forest.add_edge_uv(node, child)
+			add_to_forest(child)
+		return children
+
+	def push_leaves(leaves):
+		for leaf in leaves:
+			key = expansion_key(leaf)
+			if key is not None:
+				heappush(frontier, (key, leaf))
+
+	# Candidate roots of new trees, keyed by -(neighbors outside the forest)
+	roots = [(-outside_degree[node], node) for node in get_nodes(graph)]
+	heapify(roots)
+
+	# Ticks the budget every 256 expansions, and returns whether it ran out
+	ticked = [0]
+	ran_out = [False]
+
+	def out_of_budget():
+		if budget is not None and not ran_out[0] and expansions[0] - ticked[0] >= 256:
+			ran_out[0] = not budget.tick(expansions[0] - ticked[0])
+			ticked[0] = expansions[0]
+		return ran_out[0]
+
+	while True:
+		while frontier and not out_of_budget():
+			key, leaf = heappop(frontier)
+			current_key = expansion_key(leaf)
+			if current_key is None:
+				continue
+			if current_key != key:
+				heappush(frontier, (current_key, leaf))
+				continue
+
+			if key[0] == 1:
+				push_leaves(expand(leaf))
+			else:
+				y = expand(leaf)[0]
+				push_leaves(expand(y))
+
+		if out_of_budget():
+			break
+
+		# Start a new tree at the node with the most neighbors outside the forest
+		root = None
+		while roots:
+			negative_degree, node = heappop(roots)
+			if in_forest[node]:
+				continue
+			if -negative_degree != outside_degree[node]:
+				heappush(roots, (-outside_degree[node], node))
+				continue
+			if outside_degree[node] >= 3:
+				root = node
+			break
+
+		if root is None:
+			break
+
+		add_to_forest(root)
+		push_leaves(expand(root))
+
+	return create_spanning_tree_from_forest(graph, forest)
+
+
+# Finds a maximum leaf spanning tree exactly, for graphs with at most
+# EXACT_SOLVER_MAXIMUM_NODES nodes (returns None for larger graphs)
+#
+# For n >= 3 nodes, a spanning tree with L leaves has n - L internal nodes forming a
+# connected dominating set, and every connected dominating set S gives a spanning tree
+# with at least n - |S| leaves. So this is a branch and bound search for a minimum
+# connected dominating set, starting from the internal nodes of expanded_forest_tree:
+# - Node sets are bitmasks over nodes relabeled 0..n-1.
+# - A set grows one neighbor at a time, so it stays connected. Every dominating set
+#   contains a node in the closed neighborhood of the minimum-degree node, so the
+#   search starts from those nodes only.
+# - A branch is cut when |S| plus a degree-counting lower bound (the fewest nodes
+#   whose counts of newly dominated nodes add up to the undominated count) cannot
+#   beat the best set so far.
+# - A transposition table of sets already grown skips sets reached in another order.
+# The budget is ticked once per set grown; when it runs out, the best tree found so
+# far is returned.
+def exact_tree(graph, budget=None):
+	nodes = sorted(get_nodes(graph))
+	number_of_nodes = len(nodes)
+	if number_of_nodes > EXACT_SOLVER_MAXIMUM_NODES:
+		return None
+	if number_of_nodes <= 2:
+		return create_copy(graph)
+
+	index = dict((node, i) for i, node in enumerate(nodes))
+	neighborhoods = [0] * number_of_nodes		# Closed neighborhoods as bitmasks
+	for i in range(number_of_nodes):
+		neighborhoods[i] = 1 << i
+		for neighbor in graph.neighbors[nodes[i]]:
+			neighborhoods[i] |= 1 << index[neighbor]
+	all_nodes = (1 << number_of_nodes) - 1
+
+	# Start from the internal nodes of a heuristic tree
+	heuristic_tree = expanded_forest_tree(graph)
+	best = [0]
+	for node in nodes:
+		if heuristic_tree.degree(node) > 1:
+			best[0] |= 1 << index[node]
+	best_size = [best[0].bit_count()]
+	smallest_possible_size = number_of_nodes - get_leaf_upper_bound(graph)
+
+	transpositions = set()
+	searched = [0]
+
+	# Returns a lower bound on the number of nodes needed to dominate the rest
+	def lower_bound(chosen, dominated):
+		undominated = all_nodes & ~dominated
+		remaining = undominated.bit_count()
+		gains = sorted((neighborhoods[i] & undominated).bit_count() for i in range(number_of_nodes) if not (chosen >> i) & 1)
+		count = 0
+		while remaining > 0:
+			if not gains:
+				return number_of_nodes
+			remaining -= gains.pop()
+			count += 1
+		return count
+
+	def grow(chosen, size, dominated):
+		if dominated == all_nodes:
+			if size < best_size[0]:
+				best[0] = chosen
+				best_size[0] = size
+			return
+		if size + lower_bound(chosen, dominated) >= best_size[0]:
+			return
+
+		if chosen in transpositions:
+			return
+		if len(transpositions) >= EXACT_SOLVER_TABLE_SIZE:
+			transpositions.clear()
+		transpositions.add(chosen)
+
+		searched[0] += 1
+		if budget is not None and searched[0] % 256 == 0 and not budget.tick(256):
+			raise _OutOfBudget()
+
+		# Try the neighbors of the set that dominate the most new nodes first
+		candidates = []
+		boundary = dominated & ~chosen
+		while boundary:
+			low_bit = boundary & -boundary
+			i = low_bit.bit_length() - 1
+			candidates.append(((neighborhoods[i] & ~dominated).bit_count(), i))
+			boundary ^= low_bit
+		candidates.sort(reverse=True)
+
+		for _, i in candidates:
+			if best_size[0] <= smallest_possible_size:
+				return
+			grow(chosen | (1 << i), size + 1, dominated | neighborhoods[i])
+
+	minimum_degree_node = min(range(number_of_nodes), key=lambda i: neighborhoods[i].bit_count())
+	try:
+		for i in range(number_of_nodes):
+			if (neighborhoods[minimum_degree_node] >> i) & 1:
+				grow(1 << i, 1, neighborhoods[i])
+	except _OutOfBudget:
+		pass
+
+	# Build a tree from the connected dominating set: a spanning tree of the set, with
+	# every other node hanging from a neighbor in it
+	internal = [nodes[i] for i in range(number_of_nodes) if (best[0] >> i) & 1]
+	internal_set = set(internal)
+	tree = Graph()
+	reached = set([internal[0]])
+	queue = [internal[0]]
+	while queue:
+		node = queue.pop()
+		for neighbor in graph.neighbors[node]:
+			if neighbor not in reached:
+				reached.add(neighbor)
+				tree.add_edge_uv(node, neighbor)
+				if neighbor in internal_set:
+					queue.append(neighbor)
+
+	return tree
+
+
+class _OutOfBudget(Exception):
+	pass
 
 
 # Maintain a list of all (algorithm name, algorithm function) so that they can be
 # systematically called from graph_solver.py
 ALGORITHMS = [
 	('joined forest tree', joined_forest_tree),
-	('randomized tree', randomized_tree)
+	('randomized tree', randomized_tree),
+	('expanded forest tree', expanded_forest_tree),
+	('exact tree', exact_tree)
 ]
 
 
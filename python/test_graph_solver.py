@@ -0,0 +1,396 @@
+from graph import *
+from graph_helper import *
+from input_output import *
+from graph_solver import *
+from linkcut import *
+from local_search import *
+from itertools import combinations
+import config
+import os
+import pstats
+import random
+import shutil
+import tempfile
+import unittest
+
+"""
+This file tests graph_solver.py and the modules it solves with. Run it from this
+directory with python -m pytest.
+"""
+
+# A cycle with chords whose node IDs are far from contiguous
+SPARSE_EDGES = [(5, 15), (15, 40), (40, 1000), (1000, 77777), (77777, 5), (5, 40), (15, 1000)]
+
+
+# Returns a random connected graph on nodes 0..number_of_nodes-1: a random tree, plus
+# extra_edges random edges that are not in it (fewer if the graph fills up)
+def create_random_connected_graph(generator, number_of_nodes, extra_edges):
+	graph = Graph()
+	for v in range(1, number_of_nodes):
+		graph.add_edge_uv(generator.randrange(v), v)
+	for _ in range(extra_edges):
+		u, v = generator.sample(range(number_of_nodes), 2)
+		graph.add_edge_uv(u, v)
+	return graph
+
+
+# Returns a random spanning tree of the graph, from Kruskal's algorithm on its edges
+# in random order
+def create_random_spanning_tree(generator, graph):
+	edges = [edge.ends for edge in get_edges(graph)]
+	generator.shuffle(edges)
+	sets = DisjointSets(graph.num_node_slots)
+	tree = Graph()
+	for u, v in edges:
+		if sets.union(u, v):
+			tree.add_edge_uv(u, v)
+	return tree
+
+
+class TestPortfolio(unittest.TestCase):
+
+	# Returns the sparse graph, relabeled as do_everything reads it
+	def make_sparse_graph(self):
+		graph = Graph()
+		for u, v in SPARSE_EDGES:
+			graph.add_edge_uv(u, v)
+		return relabel_graph(graph)
+
+	# Checks that the tree is a spanning tree of the graph, numbered like it
+	def assert_spanning_tree(self, graph, tree):
+		self.assertIs(tree.labels, graph.labels)
+		self.assertTrue(is_subgraph(tree, graph))
+		self.assertTrue(is_tree(tree))
+		self.assertEqual(set(get_nodes(tree)), set(get_nodes(graph)))
+
+	def test_parallel_portfolio_on_sparse_ids(self):
+		graph = self.make_sparse_graph()
+		results = run_portfolio(graph, ALGORITHMS, instance_seconds=30, workers=2)
+		self.assertEqual(len(results), len(ALGORITHMS))
+		for _, tree, _ in results:
+			self.assert_spanning_tree(graph, tree)
+			self.assertEqual(sorted(restore_labels(tree).nodes), sorted(set(u for edge in SPARSE_EDGES for u in edge)))
+
+	def test_serial_portfolio_on_sparse_ids(self):
+		graph = self.make_sparse_graph()
+		for _, tree, _ in run_portfolio(graph, ALGORITHMS, instance_seconds=30, workers=1):
+			self.assert_spanning_tree(graph, tree)
+
+	def test_local_search_keeps_to_the_instance_deadline(self):
+		graph = self.make_sparse_graph()
+		for seconds, searched in ((0, False), (30, True)):
+			with Instrumentation(trace_memory=False) as instrumentation:
+				tree = find_leafy_spanning_tree(graph, verbose=False, instrumentation=instrumentation, portfolio_workers=1, instance_seconds=seconds)
+			self.assert_spanning_tree(graph, tree)
+			runs = [record for record in instrumentation.records if record['algorithm'].startswith('local search')]
+			self.assertEqual(len(runs) > 0, searched)
+
+	def test_portfolio_past_its_deadline_falls_back(self):
+		graph = self.make_sparse_graph()
+		for workers in (1, 2):
+			results = run_portfolio(graph, ALGORITHMS, instance_seconds=0, workers=workers)
+			self.assertEqual([name for name, _, _ in results], ['joined forest tree (fallback)'])
+			self.assert_spanning_tree(graph, results[0][1])
+
+
+class TestGraphCache(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.file_name = os.path.join(self.directory, 'graphs.in')
+		shutil.copyfile('hard.all.v3.in', self.file_name)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	# Checks that two lists of graphs hold the same graphs in the same order
+	def assert_same_graphs(self, graphs_1, graphs_2):
+		self.assertEqual([graph.to_bytes() for graph in graphs_1], [graph.to_bytes() for graph in graphs_2])
+
+	def test_cache_is_written_only_on_request(self):
+		input_graphs_from_file(self.file_name)
+		self.assertFalse(os.path.exists(self.file_name + GRAPH_CACHE_SUFFIX))
+		input_graphs_from_file(self.file_name, use_cache=True)
+		self.assertTrue(os.path.exists(self.file_name + GRAPH_CACHE_SUFFIX))
+
+	def test_cache_round_trip(self):
+		parsed = parse_graphs_in_file(self.file_name)
+		save_graphs_to_cache(self.file_name, parsed)
+		self.assert_same_graphs(load_graphs_from_cache(self.file_name), parsed)
+		self.assert_same_graphs(load_graphs_from_cache(self.file_name, relabel=True), parsed)
+
+	def test_corrupt_cache_is_discarded(self):
+		parsed = parse_graphs_in_file(self.file_name)
+		save_graphs_to_cache(self.file_name, parsed)
+		cache_file_name = self.file_name + GRAPH_CACHE_SUFFIX
+		with open(cache_file_name, 'rb') as cache_file:
+			data = cache_file.read()
+		records_start = GRAPH_CACHE_HEADER.size + 8 * (len(parsed) + 1)
+		corruptions = [
+			data[:len(data) // 2],
+			data[:GRAPH_CACHE_HEADER.size],
+			data[:records_start] + b'\x03' + data[records_start + 1:],
+			data[:-4] + bytes(4),
+		]
+		for corrupted in corruptions:
+			with open(cache_file_name, 'wb') as cache_file:
+				cache_file.write(corrupted)
+			self.assertIsNone(load_graphs_from_cache(self.file_name))
+			self.assert_same_graphs(input_graphs_from_file(self.file_name, use_cache=True), parsed)
+
+
+class TestParallelSolver(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.file_name = os.path.join(self.directory, 'graphs.in')
+		graphs = []
+		for shift in (0, 3, 100):
+			graph = Graph()
+			for u, v in SPARSE_EDGES:
+				graph.add_edge_uv(u + shift, v + shift)
+			graphs.append(graph)
+		output_graphs_to_new_file(graphs, self.file_name)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_file_is_solved_in_order_by_any_number_of_workers(self):
+		graphs = input_graphs_from_file(self.file_name)
+		for workers in (1, 2):
+			output_file_name = os.path.join(self.directory, str(workers) + '.out')
+			find_leafy_spanning_trees_in_file(self.file_name, workers=workers, chunk_size=2, output_file_name=output_file_name)
+			trees = input_graphs_from_file(output_file_name)
+			self.assertEqual(len(trees), len(graphs))
+			for graph, tree in zip(graphs, trees):
+				self.assertTrue(is_subgraph(tree, graph))
+				self.assertTrue(is_tree(tree))
+				self.assertEqual(set(get_nodes(tree)), set(get_nodes(graph)))
+
+	def test_parallel_file_solutions_reach_the_store(self):
+		with SolutionStore(os.path.join(self.directory, 'solutions.db')) as solution_store:
+			find_leafy_spanning_trees_in_file(self.file_name, solution_store, workers=2, chunk_size=2)
+			for graph in input_graphs_from_file(self.file_name, relabel=True):
+				tree = solution_store.best_tree(graph)
+				self.assertTrue(is_tree(tree))
+				self.assertEqual(len(get_nodes(tree)), len(get_nodes(graph)))
+
+	def test_profile_sees_the_algorithms(self):
+		profile_file_name = os.path.join(self.directory, 'profile')
+		profile_algorithms(self.file_name, os.path.join(self.directory, 'records.jsonl'), profile_file_name)
+		profiled_functions = set(function for _, _, function in pstats.Stats(profile_file_name).stats)
+		# The race stops at the first tree reaching the leaf upper bound
+		self.assertIn(ALGORITHMS[0][1].__name__, profiled_functions)
+
+
+class TestReadingFiles(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	# Writes the given bytes to a file in the temporary directory, and returns its name
+	def write_file(self, name, data):
+		file_name = os.path.join(self.directory, name)
+		with open(file_name, 'wb') as output_file:
+			output_file.write(data)
+		return file_name
+
+	def test_line_endings_do_not_change_limits(self):
+		lines = b'1\n2500\n' + b''.join(b'%d %d\n' % (500 * i, 500 * i + 500) for i in range(2500))
+		graphs = input_graphs_from_file(self.write_file('lf.in', lines))
+		self.assertEqual(graphs[0].num_edges(), 2500)
+		crlf_graphs = input_graphs_from_file(self.write_file('crlf.in', lines.replace(b'\n', b'\r\n')))
+		self.assertEqual([graph.to_bytes() for graph in crlf_graphs], [graph.to_bytes() for graph in graphs])
+		self.assertEqual((config.MAX_NUM_NODES, config.MAX_NUM_EDGES), (100, 2000))
+
+	def test_blank_lines_after_the_last_graph_are_ignored(self):
+		graphs = input_graphs_from_file(self.write_file('blank.in', b'1\n2\n0 5\n7 0\n\n\n'))
+		self.assertEqual(graphs[0].to_bytes(), make_graph_from_ends([(0, 5), (7, 0)]).to_bytes())
+
+	def test_unreadable_file_raises_an_exception(self):
+		for data in [b'1\n3\n0 5\n', b'1\n2\n0 5\nx y\n', b'1\n2\n0 5\n5 05\n']:
+			with self.assertRaises(GraphFileError) as context:
+				input_graphs_from_file(self.write_file('bad.in', data))
+			self.assertIsInstance(context.exception, Exception)
+			self.assertIn('line 4', str(context.exception))
+
+
+class TestLinkCutTree(unittest.TestCase):
+
+	# Returns the nodes on the path from u to v in a forest given by neighbor sets, or
+	# None if they are in different trees
+	def naive_path(self, neighbors, u, v):
+		previous = {u: None}
+		queue = [u]
+		while queue:
+			node = queue.pop()
+			for neighbor in neighbors[node]:
+				if neighbor not in previous:
+					previous[neighbor] = node
+					queue.append(neighbor)
+		if v not in previous:
+			return None
+		path = [v]
+		while path[-1] != u:
+			path.append(previous[path[-1]])
+		return path[::-1]
+
+	def test_operations_match_a_naive_forest(self):
+		generator = random.Random(12)
+		number_of_nodes = 30
+		paths = LinkCutTree(number_of_nodes)
+		neighbors = [set() for _ in range(number_of_nodes)]
+		values = [0] * number_of_nodes
+		edges = []
+
+		for _ in range(3000):
+			u, v = generator.sample(range(number_of_nodes), 2)
+			path = self.naive_path(neighbors, u, v)
+			operation = generator.random()
+
+			if operation < 0.3 and path is None:
+				paths.link(u, v)
+				neighbors[u].add(v)
+				neighbors[v].add(u)
+				edges.append((u, v))
+			elif operation < 0.45 and edges:
+				u, v = edges.pop(generator.randrange(len(edges)))
+				paths.cut(u, v)
+				neighbors[u].discard(v)
+				neighbors[v].discard(u)
+			elif operation < 0.65:
+				values[u] = generator.randrange(10)
+				paths.set_value(u, values[u])
+				self.assertEqual(paths.get_value(u), values[u])
+			else:
+				self.assertEqual(paths.connected(u, v), path is not None)
+				if path is not None:
+					minimum, node = paths.path_minimum(u, v)
+					self.assertEqual(minimum, min(values[node] for node in path))
+					self.assertIn(node, path)
+					self.assertEqual(values[node], minimum)
+					self.assertEqual(paths.next_on_path(u, v), path[1])
+
+
+class TestLocalSearch(unittest.TestCase):
+
+	def test_improved_trees_span_the_graph_and_keep_their_leaves(self):
+		generator = random.Random(13)
+		improved = 0
+		for _ in range(60):
+			number_of_nodes = generator.randrange(3, 60)
+			graph = create_random_connected_graph(generator, number_of_nodes, generator.randrange(3 * number_of_nodes))
+			tree = create_random_spanning_tree(generator, graph)
+
+			improved_tree = improve_tree(graph, tree)
+			self.assertTrue(is_subgraph(improved_tree, graph))
+			self.assertTrue(is_tree(improved_tree))
+			self.assertEqual(set(get_nodes(improved_tree)), set(get_nodes(graph)))
+			self.assertGreaterEqual(len(get_leaves(improved_tree)), len(get_leaves(tree)))
+			improved += len(get_leaves(improved_tree)) > len(get_leaves(tree))
+
+		# Random spanning trees are far from leafy, so most of them improve
+		self.assertGreater(improved, 30)
+
+	def test_exhausted_budget_returns_a_spanning_tree(self):
+		generator = random.Random(14)
+		graph = create_random_connected_graph(generator, 40, 80)
+		tree = create_random_spanning_tree(generator, graph)
+		improved_tree = improve_tree(graph, tree, Budget(iterations=0))
+		self.assertTrue(is_tree(improved_tree))
+		self.assertEqual(set(get_nodes(improved_tree)), set(get_nodes(graph)))
+		self.assertGreaterEqual(len(get_leaves(improved_tree)), len(get_leaves(tree)))
+
+
+class TestExactTree(unittest.TestCase):
+
+	# Returns the most leaves of any spanning tree of the graph, by trying every set of
+	# n - 1 edges
+	def brute_force_leaves(self, graph):
+		nodes = get_nodes(graph)
+		edges = [edge.ends for edge in get_edges(graph)]
+		most_leaves = 0
+		for tree_edges in combinations(edges, len(nodes) - 1):
+			sets = DisjointSets(graph.num_node_slots)
+			if all(sets.union(u, v) for u, v in tree_edges):
+				degrees = {}
+				for u, v in tree_edges:
+					degrees[u] = degrees.get(u, 0) + 1
+					degrees[v] = degrees.get(v, 0) + 1
+				most_leaves = max(most_leaves, list(degrees.values()).count(1))
+		return most_leaves
+
+	def test_matches_brute_force_on_small_graphs(self):
+		generator = random.Random(15)
+		beats_heuristic = 0
+		for _ in range(1200):
+			number_of_nodes = generator.randrange(3, 9)
+			graph = create_random_connected_graph(generator, number_of_nodes, generator.randrange(number_of_nodes))
+			tree = exact_tree(graph)
+			self.assertTrue(is_subgraph(tree, graph))
+			self.assertTrue(is_tree(tree))
+			self.assertEqual(set(get_nodes(tree)), set(get_nodes(graph)))
+			most_leaves = self.brute_force_leaves(graph)
+			self.assertEqual(len(get_leaves(tree)), most_leaves)
+			beats_heuristic += len(get_leaves(expanded_forest_tree(graph))) < most_leaves
+
+		# The search starts from the tree of expanded_forest_tree, which is optimal on
+		# most small graphs; make sure it was tested on some where it is not
+		self.assertGreaterEqual(beats_heuristic, 5)
+
+	def test_large_graphs_are_left_to_the_heuristics(self):
+		graph = create_random_connected_graph(random.Random(16), EXACT_SOLVER_MAXIMUM_NODES + 1, 10)
+		self.assertIsNone(exact_tree(graph))
+
+
+class TestDisjointSets(unittest.TestCase):
+
+	def state(self, sets):
+		return list(sets.parent), list(sets.rank), sets.num_components
+
+	def test_rollback_restores_every_snapshot(self):
+		generator = random.Random(17)
+		sets = DisjointSets(40)
+		for _ in range(20):
+			tokens = []
+			states = []
+			for _ in range(generator.randrange(1, 4)):
+				tokens.append(sets.snapshot())
+				states.append(self.state(sets))
+				for _ in range(generator.randrange(15)):
+					sets.union(generator.randrange(40), generator.randrange(40))
+					sets.find(generator.randrange(40))
+
+			# Roll back to a random snapshot, which closes it and every later one
+			depth = generator.randrange(len(tokens))
+			sets.rollback(tokens[depth])
+			self.assertEqual(self.state(sets), states[depth])
+			if depth > 0:
+				sets.rollback(tokens[0])
+				self.assertEqual(self.state(sets), states[0])
+			self.assertIsNone(sets.history)
+
+			# Keep some changes between rounds
+			sets.union(generator.randrange(40), generator.randrange(40))
+
+	def test_reset_reuses_the_arrays(self):
+		sets = DisjointSets(5)
+		parent, rank = sets.parent, sets.rank
+		sets.union(0, 1)
+		sets.snapshot()
+		sets.union(2, 3)
+		sets.reset(8)
+		self.assertIs(sets.parent, parent)
+		self.assertIs(sets.rank, rank)
+		self.assertEqual(self.state(sets), (list(range(8)), [0] * 8, 8))
+		self.assertIsNone(sets.history)
+		sets.union(4, 7)
+		self.assertTrue(sets.connected(7, 4))
+		self.assertEqual(sets.num_components, 7)
+
+
+if __name__ == '__main__':
+	unittest.main()